@@ -0,0 +1,162 @@
+"""
+Micro-benchmark for count_cyclomatic_complexity.
+
+Compares the current combined decision-point scanner against the previous
+per-keyword implementation (kept below as a reference), checks that both
+give identical CC values and reports lines/second for each.
+
+Usage: python3 benchmarks/bench_cyclomatic.py <path_to_repo_or_file> [--repeat N]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from file_scanner import get_source_files
+from language_rules import LANGUAGE_RULES
+from loc_counter import count_cyclomatic_complexity, detect_language
+
+
+def legacy_count_cyclomatic_complexity(code, lang):
+    """
+    Previous implementation: up to ten regex scans per line.
+    """
+    cc_results = {}
+    current_func = None
+    cc = 1
+    inside_function = False
+    base_indent = None
+    brace_depth = 0
+    entered_body = False
+
+    for raw in code.splitlines():
+        original = raw
+        line = raw.strip()
+
+        if lang not in LANGUAGE_RULES:
+            return {}
+        if not line or line.startswith(LANGUAGE_RULES[lang]["single_line_comment"]):
+            continue
+
+        if lang == "python":
+            func_def = re.search(r"^def\s+([A-Za-z_]\w*)\s*\([^)]*\)\s*:", original)
+        else:
+            func_def = re.search(r"\b([A-Za-z_]\w*)\s*\([^)]*\)\s*(\{)?\s*$", line)
+
+        if func_def:
+            if lang == "python":
+                new_name = func_def.group(1)
+                new_indent = len(original) - len(original.lstrip())
+                if inside_function:
+                    cc_results[current_func] = cc
+                current_func = new_name
+                cc = 1
+                inside_function = True
+                base_indent = new_indent
+                continue
+            else:
+                new_name = func_def.group(1)
+                has_open_brace = (func_def.lastindex and func_def.group(2) == "{")
+                if not inside_function or (entered_body and brace_depth == 0):
+                    if inside_function:
+                        cc_results[current_func] = cc
+                    current_func = new_name
+                    cc = 1
+                    inside_function = True
+                    brace_depth = 1 if has_open_brace else 0
+                    entered_body = bool(has_open_brace)
+                    continue
+
+        if inside_function:
+            if lang == "python":
+                tmp = line
+                cc += len(re.findall(r'\belif\b', tmp))
+                cc += len(re.findall(r'\bif\b', tmp))
+                cc += len(re.findall(r'\bfor\b', tmp))
+                cc += len(re.findall(r'\bwhile\b', tmp))
+                cc += len(re.findall(r'\bexcept\b', tmp))
+                if line and not line.startswith("#"):
+                    cur_indent = len(original) - len(original.lstrip())
+                    if cur_indent <= base_indent and not line.startswith("def"):
+                        cc_results[current_func] = cc
+                        current_func = None
+                        inside_function = False
+                        base_indent = None
+            else:
+                opens = original.count("{")
+                closes = original.count("}")
+                if opens:
+                    entered_body = True
+                    brace_depth += opens
+                if closes:
+                    brace_depth -= closes
+                if entered_body:
+                    tmp = line
+                    cc += len(re.findall(r'\belse\s+if\b', tmp))
+                    tmp = re.sub(r'\belse\s+if\b', 'ELSE_IF', tmp)
+                    cc += len(re.findall(r'\bif\b', tmp))
+                    cc += len(re.findall(r'\bfor\b', tmp))
+                    cc += len(re.findall(r'\bwhile\b', tmp))
+                    cc += len(re.findall(r'\bcase\b', tmp))
+                    cc += len(re.findall(r'\bcatch\b', tmp))
+                    cc += tmp.count('&&')
+                    cc += tmp.count('||')
+                    cc += tmp.count('?')
+                if entered_body and brace_depth == 0:
+                    cc_results[current_func] = cc
+                    current_func = None
+                    inside_function = False
+                    entered_body = False
+                    brace_depth = 0
+
+    if inside_function and current_func is not None:
+        cc_results[current_func] = cc
+    return cc_results
+
+
+def time_it(func, sources, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for code, lang in sources:
+            func(code, lang)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark count_cyclomatic_complexity.")
+    parser.add_argument("path", help="Path to repo or single source file")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions, the best run is reported")
+    args = parser.parse_args()
+
+    sources = []
+    for file_path in get_source_files(args.path):
+        lang = detect_language(file_path)
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+            sources.append((f.read(), lang))
+    n_lines = sum(len(code.splitlines()) for code, _ in sources)
+    if not n_lines:
+        print("No supported source files found.")
+        return
+
+    mismatches = sum(1 for code, lang in sources
+                     if count_cyclomatic_complexity(code, lang) != legacy_count_cyclomatic_complexity(code, lang))
+
+    before = time_it(legacy_count_cyclomatic_complexity, sources, args.repeat)
+    after = time_it(count_cyclomatic_complexity, sources, args.repeat)
+
+    print(f"{len(sources)} files, {n_lines:,} lines")
+    print(f"Before: {n_lines / before:,.0f} lines/s ({before:.2f} s)")
+    print(f"After:  {n_lines / after:,.0f} lines/s ({after:.2f} s)")
+    print(f"Speed-up: {before / after:.2f}x")
+    print(f"Files with different CC values: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
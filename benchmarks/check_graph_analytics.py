@@ -0,0 +1,139 @@
+"""
+Correctness check for graph_analytics.
+
+Builds random call graphs (sparse and dense, with self-loops, cycles and
+isolated functions) and compares strongly_connected_components,
+transitive_fan_in/out (also with tiny reachability blocks) and call_depth
+against brute-force breadth-first searches from every function.
+
+Usage: python3 benchmarks/check_graph_analytics.py [--graphs N] [--max-nodes N] [--seed S]
+"""
+import argparse
+import os
+import random
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from call_graph import CallGraph
+from graph_analytics import (_condensed_edges, _reach_counts, call_depth, component_sizes, entry_points,
+                             recursion_cycles, strongly_connected_components, transitive_fan_in,
+                             transitive_fan_out)
+
+
+def random_graph(rng, n):
+    # Edge density from a chain-like tree to a near-complete graph
+    p = rng.choice([0.5 / max(n, 1), 1.5 / max(n, 1), 4.0 / max(n, 1), 0.3])
+    sources, targets = [], []
+    for s in range(n):
+        for t in range(n):
+            if rng.random() < p:
+                sources.append(s)
+                targets.append(t)
+    nodes = [(f"f{i % 7}.c", f"fn{i}", i + 1) for i in range(n)]
+    return CallGraph(nodes, sources, targets)
+
+
+def reachable(graph, start):
+    """
+    Every node reachable from start through at least one call.
+    """
+    seen = set()
+    queue = deque(graph.callees(start))
+    while queue:
+        v = queue.popleft()
+        if v not in seen:
+            seen.add(v)
+            queue.extend(graph.callees(v))
+    return seen
+
+
+def bfs_depth(graph, entries):
+    depth = [-1] * len(graph)
+    queue = deque()
+    for node in entries:
+        if depth[node] == -1:
+            depth[node] = 0
+            queue.append(node)
+    while queue:
+        v = queue.popleft()
+        for w in graph.callees(v):
+            if depth[w] == -1:
+                depth[w] = depth[v] + 1
+                queue.append(w)
+    return depth
+
+
+def check_graph(graph, rng):
+    """
+    List of the differences to the brute-force results (empty if none).
+    """
+    n = len(graph)
+    errors = []
+    reach = [reachable(graph, v) for v in range(n)]
+
+    component, n_components = strongly_connected_components(graph)
+    for v in range(n):
+        for w in range(n):
+            together = v == w or (w in reach[v] and v in reach[w])
+            if (component[v] == component[w]) != together:
+                errors.append(f"scc: {v} and {w} {'split' if together else 'merged'}")
+    for s, t in graph.edges():
+        if component[t] > component[s]:
+            errors.append(f"scc order: call {s} -> {t} goes to a higher component id")
+    cycles = sorted(sorted(c) for c in recursion_cycles(graph))
+    members = {}
+    for v in range(n):
+        members.setdefault(component[v], []).append(v)
+    if cycles != sorted(m for m in members.values() if len(m) > 1):
+        errors.append("recursion_cycles differs from the components")
+
+    want_out = [len(reach[v] - {v}) for v in range(n)]
+    want_in = [sum(1 for u in range(n) if u != v and v in reach[u]) for v in range(n)]
+    if list(transitive_fan_out(graph)) != want_out:
+        errors.append(f"transitive_fan_out {list(transitive_fan_out(graph))} != {want_out}")
+    if list(transitive_fan_in(graph)) != want_in:
+        errors.append(f"transitive_fan_in {list(transitive_fan_in(graph))} != {want_in}")
+
+    # Several blocks per pass, as on graphs with more than REACH_BLOCK_BITS components
+    sizes = component_sizes(component, n_components)
+    pairs = _condensed_edges(graph, component)
+    for block in (1, 2, 3, 64):
+        counts = _reach_counts(n_components, pairs, sizes, block=block)
+        if [counts[c] - 1 for c in component] != want_out:
+            errors.append(f"_reach_counts with block={block} differs")
+
+    if list(call_depth(graph)) != bfs_depth(graph, [v for v in range(n) if graph.fan_in(v) == 0]):
+        errors.append("call_depth from the uncalled functions differs")
+    names = [graph.nodes[v][1] for v in rng.sample(range(n), min(n, 2))]
+    entries = entry_points(graph, names)
+    if list(call_depth(graph, entries)) != bfs_depth(graph, entries):
+        errors.append(f"call_depth from {names} differs")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check graph_analytics against brute-force reachability.")
+    parser.add_argument("--graphs", type=int, default=300, help="Number of random graphs (default: 300)")
+    parser.add_argument("--max-nodes", type=int, default=40, help="Functions per graph at most (default: 40)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failed = 0
+    for i in range(args.graphs):
+        graph = random_graph(rng, rng.randint(0, args.max_nodes))
+        errors = check_graph(graph, rng)
+        if errors:
+            failed += 1
+            print(f"Graph {i} ({len(graph)} functions, {graph.num_edges} calls):")
+            for error in errors[:5]:
+                print(f"  {error}")
+    print(f"{args.graphs} random graphs checked, {failed} with differences.")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
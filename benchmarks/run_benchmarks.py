@@ -0,0 +1,159 @@
+"""
+Benchmark suite for the measurement tool.
+
+Generates (or reuses) a deterministic synthetic tree, times the analysis
+stages (count_physical_loc, count_logical_loc, count_cyclomatic_complexity,
+compute_fan_in_out) and the end-to-end measurement_tool.main, and reports
+throughput and peak memory per stage. Results are written as JSON; with
+--baseline the run fails when a stage got slower than the threshold.
+
+Usage: python3 benchmarks/run_benchmarks.py [--files N] [--functions N] [--depth N] [--calls N]
+                                            [--out results.json] [--baseline old.json] [--threshold 0.2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import measurement_tool
+from loc_counter import (analyze_code, compute_fan_in_out, count_cyclomatic_complexity,
+                         count_logical_loc, count_physical_loc, detect_language)
+from synthetic_repo import generate_repo
+
+
+def load_sources(paths):
+    sources = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            sources.append((path, f.read(), detect_language(path)))
+    return sources
+
+
+def measure(func, repeat):
+    """
+    Best wall time over repeat runs, then one extra run under tracemalloc
+    for the peak memory (kept separate so tracing does not skew timings).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def run_suite(repo_dir, paths, repeat):
+    sources = load_sources(paths)
+    n_files = len(sources)
+    n_bytes = sum(os.path.getsize(p) for p in paths)
+    summaries = [analyze_code(path, code, lang) for path, code, lang in sources]
+    n_functions = sum(len(s["functions"]) for s in summaries)
+
+    def end_to_end():
+        with tempfile.TemporaryDirectory() as tmp:
+            argv = sys.argv
+            sys.argv = ["measurement_tool.py", "--repo", repo_dir, "--out", os.path.join(tmp, "out.csv"),
+                        "--no-cache", "--jobs", "1"]
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    measurement_tool.main()
+            finally:
+                sys.argv = argv
+
+    stages = {
+        "count_physical_loc": lambda: [count_physical_loc(code) for _, code, _ in sources],
+        "count_logical_loc": lambda: [count_logical_loc(code, lang) for _, code, lang in sources],
+        "count_cyclomatic_complexity": lambda: [count_cyclomatic_complexity(code, lang)
+                                                for _, code, lang in sources],
+        "compute_fan_in_out": lambda: compute_fan_in_out(summaries),
+        "end_to_end": end_to_end,
+    }
+
+    results = {}
+    for name, func in stages.items():
+        seconds, peak = measure(func, repeat)
+        results[name] = {
+            "seconds": round(seconds, 6),
+            "files_per_s": round(n_files / seconds, 1),
+            "mb_per_s": round(n_bytes / seconds / 1e6, 3),
+            "functions_per_s": round(n_functions / seconds, 1),
+            "peak_mb": round(peak / 1e6, 3),
+        }
+    return {"files": n_files, "bytes": n_bytes, "functions": n_functions, "stages": results}
+
+
+def check_regressions(results, baseline, threshold):
+    """
+    Stages whose time grew by more than threshold (fraction) against the baseline.
+    """
+    regressions = []
+    for name, stage in results["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if old and stage["seconds"] > old["seconds"] * (1 + threshold):
+            regressions.append((name, old["seconds"], stage["seconds"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the measurement tool stages.")
+    parser.add_argument("--files", type=int, default=300, help="Number of synthetic files")
+    parser.add_argument("--functions", type=int, default=20, help="Functions per file")
+    parser.add_argument("--depth", type=int, default=3, help="Nesting depth of control flow")
+    parser.add_argument("--calls", type=int, default=4, help="Calls per function")
+    parser.add_argument("--languages", type=str, default="c,java,python",
+                        help="Comma separated list of languages (c, java, python)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions, the best run is reported")
+    parser.add_argument("--out", type=str, default="benchmark_results.json", help="Output JSON file")
+    parser.add_argument("--baseline", type=str, default=None, help="Previous JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown per stage against the baseline (default: 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    config = {
+        "files": args.files, "functions": args.functions, "depth": args.depth,
+        "calls": args.calls, "languages": args.languages,
+    }
+    with tempfile.TemporaryDirectory() as repo_dir:
+        paths = generate_repo(repo_dir, args.files, args.functions, args.depth, args.calls,
+                              tuple(args.languages.split(",")))
+        results = run_suite(repo_dir, paths, args.repeat)
+    results["config"] = config
+    results["python"] = platform.python_version()
+
+    print(f"{results['files']} files, {results['bytes'] / 1e6:.2f} MB, {results['functions']} functions")
+    print(f"{'stage':30} {'seconds':>9} {'files/s':>10} {'MB/s':>8} {'funcs/s':>11} {'peak MB':>8}")
+    for name, s in results["stages"].items():
+        print(f"{name:30} {s['seconds']:9.3f} {s['files_per_s']:10.1f} {s['mb_per_s']:8.2f} "
+              f"{s['functions_per_s']:11.1f} {s['peak_mb']:8.2f}")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("⚠️ Baseline was run with a different configuration.")
+        regressions = check_regressions(results, baseline, args.threshold)
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old:.3f} s -> {new:.3f} s")
+        if regressions:
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Deterministic synthetic source tree generator for benchmarks.
+
+Generates C, Java and Python files with a configurable number of files,
+functions per file, nesting depth and call density. The same arguments
+(and seed) always produce byte-identical trees.
+
+Usage: python3 benchmarks/synthetic_repo.py <output_dir> [--files N] [--functions N]
+                                            [--depth N] [--calls N] [--languages c,java,python]
+"""
+import argparse
+import os
+import random
+
+EXTENSIONS = {"c": ".c", "java": ".java", "python": ".py"}
+
+
+def generate_repo(output_dir, files=100, functions=20, depth=3, calls=4,
+                  languages=("c", "java", "python"), seed=42):
+    """
+    Write the synthetic tree to output_dir and return the list of file paths.
+    Files are spread over sub-directories of 50 files each.
+    """
+    rng = random.Random(seed)
+    paths = []
+    for i in range(files):
+        lang = languages[i % len(languages)]
+        sub_dir = os.path.join(output_dir, f"dir{i // 50:03d}")
+        os.makedirs(sub_dir, exist_ok=True)
+        name = f"mod{i:05d}"
+        path = os.path.join(sub_dir, name + EXTENSIONS[lang])
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(_generate_file(rng, lang, i, files, functions, depth, calls))
+        paths.append(path)
+    return paths
+
+
+def _func_name(file_idx, func_idx):
+    return f"f{file_idx}_{func_idx}"
+
+
+def _random_calls(rng, files, functions, calls):
+    return [_func_name(rng.randrange(files), rng.randrange(functions)) for _ in range(calls)]
+
+
+def _generate_file(rng, lang, file_idx, files, functions, depth, calls):
+    out = []
+    if lang == "c":
+        out.append(f"/* Synthetic module {file_idx} */\n#include <stdio.h>\n\n")
+    elif lang == "java":
+        out.append(f"package synthetic;\n\n/* Synthetic module {file_idx} */\npublic class Mod{file_idx} {{\n\n")
+    else:
+        out.append(f'"""\nSynthetic module {file_idx}\n"""\nimport os\n\n')
+
+    for k in range(functions):
+        name = _func_name(file_idx, k)
+        callees = _random_calls(rng, files, functions, calls)
+        if lang == "python":
+            out.append(_python_function(rng, name, callees, depth))
+        else:
+            out.append(_c_like_function(rng, lang, name, callees, depth))
+
+    if lang == "java":
+        out.append("}\n")
+    return "".join(out)
+
+
+def _c_like_function(rng, lang, name, callees, depth):
+    indent = "    " * (2 if lang == "java" else 1)
+    head = f"    public static int {name}(int x) {{\n" if lang == "java" else f"int {name}(int x)\n{{\n"
+    lines = [head, f"{indent}// compute {name}\n", f"{indent}int y = x * 2;\n"]
+    for d in range(depth):
+        pad = indent + "    " * d
+        kind = rng.choice(("if", "for", "while"))
+        if kind == "if":
+            lines.append(f"{pad}if (y > {d} && x < {d * 3}) {{\n")
+        elif kind == "for":
+            lines.append(f"{pad}for (int i{d} = 0; i{d} < x; i{d}++) {{\n")
+        else:
+            lines.append(f"{pad}while (y-- > {d}) {{\n")
+    pad = indent + "    " * depth
+    for callee in callees:
+        lines.append(f"{pad}y += {callee}(y);\n")
+    for d in reversed(range(depth)):
+        lines.append(indent + "    " * d + "}\n")
+    lines.append(f"{indent}return y > 0 ? y : -y;\n")
+    lines.append("    }\n\n" if lang == "java" else "}\n\n")
+    return "".join(lines)
+
+
+def _python_function(rng, name, callees, depth):
+    lines = [f"def {name}(x):\n", "    # compute\n", "    y = x * 2\n"]
+    for d in range(depth):
+        pad = "    " * (d + 1)
+        kind = rng.choice(("if", "for", "while"))
+        if kind == "if":
+            lines.append(f"{pad}if y > {d} and x < {d * 3}:\n")
+        elif kind == "for":
+            lines.append(f"{pad}for i{d} in range(x):\n")
+        else:
+            lines.append(f"{pad}while y > {d}:\n")
+    pad = "    " * (depth + 1)
+    for callee in callees:
+        lines.append(f"{pad}y += {callee}(y)\n")
+    lines.append("    return y\n\n\n")
+    return "".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic source tree.")
+    parser.add_argument("output_dir", help="Directory to create the tree in")
+    parser.add_argument("--files", type=int, default=100, help="Number of files")
+    parser.add_argument("--functions", type=int, default=20, help="Functions per file")
+    parser.add_argument("--depth", type=int, default=3, help="Nesting depth of control flow")
+    parser.add_argument("--calls", type=int, default=4, help="Calls per function")
+    parser.add_argument("--languages", type=str, default="c,java,python",
+                        help="Comma separated list of languages (c, java, python)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    args = parser.parse_args()
+
+    paths = generate_repo(args.output_dir, args.files, args.functions, args.depth, args.calls,
+                          tuple(args.languages.split(",")), args.seed)
+    print(f"{len(paths)} files generated in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import time
+import zlib
+
+import language_rules
+import lexer
+import loc_counter
+import python_ast
+from language_rules import LANGUAGE_RULES
+from loc_counter import ANALYZER_VERSION, content_digest
+
+DEFAULT_MAX_MB = 512
+
+# Every module whose code shapes a summary, hashed into the cache key
+ANALYZER_MODULES = (loc_counter, lexer, python_ast, language_rules)
+
+
+def cache_key(backend="heuristic"):
+    """
+    Invalidation key: analyzer version and backend, language rules and the
+    analyzer sources themselves. Any change drops all cached entries.
+    """
+    h = hashlib.sha1()
+    h.update(ANALYZER_VERSION.encode())
+    h.update(backend.encode())
+    h.update(json.dumps(LANGUAGE_RULES, sort_keys=True).encode())
+    for module in ANALYZER_MODULES:
+        with open(module.__file__, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    """
+    On-disk (SQLite) cache of per-file summaries.
+    Entries are matched by path + size + mtime; when only the mtime differs
+    the content hash decides. The total size is capped, least recently used
+    entries are evicted first.
+    """
+
+    def __init__(self, db_path, max_mb=DEFAULT_MAX_MB, backend="heuristic"):
+        self.db_path = db_path
+        self.backend = backend
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._pending = {}   # path -> (size, mtime_ns) seen before analysis
+        self._touched = []   # paths hit during this run
+        import sqlite3  # only runs with a cache load it
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS entries (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                digest TEXT,
+                summary BLOB,
+                nbytes INTEGER,
+                last_used REAL
+            );
+        """)
+        self._check_version()
+
+    def _check_version(self):
+        key = cache_key(self.backend)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != key:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (key,))
+            self.conn.commit()
+
+    def get(self, file_path):
+        """
+        Return the cached summary for file_path, or None on a miss.
+        """
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, digest, summary FROM entries WHERE path = ?",
+            (file_path,)).fetchone()
+
+        if row is not None and row[0] == st.st_size:
+            size, mtime_ns, digest, blob = row
+            if mtime_ns != st.st_mtime_ns:
+                # Content-hash fallback (touched but unchanged files)
+                try:
+                    with open(file_path, "rb") as f:
+                        same = content_digest(f.read()) == digest
+                except OSError:
+                    same = False
+                if same:
+                    self.conn.execute("UPDATE entries SET mtime_ns = ? WHERE path = ?",
+                                      (st.st_mtime_ns, file_path))
+                    mtime_ns = st.st_mtime_ns
+            if mtime_ns == st.st_mtime_ns:
+                self.hits += 1
+                self._touched.append(file_path)
+                return decode_summary(blob)
+
+        self.misses += 1
+        self._pending[file_path] = (st.st_size, st.st_mtime_ns)
+        return None
+
+    def put(self, summary):
+        """
+        Store a freshly computed summary. The stat taken before the analysis
+        is used, so a file modified meanwhile is re-checked next time.
+        """
+        file_path = summary["file"]
+        stat = self._pending.pop(file_path, None)
+        if stat is None:
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                return
+            stat = (st.st_size, st.st_mtime_ns)
+        blob = encode_summary(summary)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (file_path, stat[0], stat[1], summary.get("digest"), blob, len(blob), time.time()))
+
+    def close(self):
+        now = time.time()
+        self.conn.executemany("UPDATE entries SET last_used = ? WHERE path = ?",
+                              ((now, p) for p in self._touched))
+        self._evict()
+        self.conn.commit()
+        self.conn.close()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Evict least recently used entries down to 90% of the cap
+        target = total - int(self.max_bytes * 0.9)
+        victims = []
+        freed = 0
+        for path, nbytes in self.conn.execute(
+                "SELECT path, nbytes FROM entries ORDER BY last_used"):
+            victims.append((path,))
+            freed += nbytes
+            if freed >= target:
+                break
+        self.conn.executemany("DELETE FROM entries WHERE path = ?", victims)
+
+
+def encode_summary(summary):
+    return zlib.compress(json.dumps(summary, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_summary(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
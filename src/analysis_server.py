@@ -0,0 +1,490 @@
+"""
+Long-running analysis server.
+
+Keeps the per-file summaries and the call graph in memory, watches the tree
+(inotify on Linux, polling otherwise) and re-analyzes only touched files.
+Queries are answered as line-delimited JSON-RPC on stdin/stdout or on a
+local Unix socket, e.g.
+
+    {"id": 1, "method": "function", "params": {"name": "kmalloc"}}
+    {"id": 2, "method": "top", "params": {"metric": "cyclomatic", "n": 20, "dir": "linux/mm"}}
+
+Run: python3 src/analysis_server.py --repo <path> [--socket /tmp/metrics.sock]
+"""
+import argparse
+import ctypes
+import ctypes.util
+import heapq
+import json
+import os
+import select
+import socketserver
+import stat
+import struct
+import sys
+import threading
+import time
+
+from file_scanner import SKIPPED_DIRS, SUPPORTED_EXTENSIONS, get_source_files
+from loc_counter import BACKENDS, analyze_source, definition_keys, resolve_call
+from measurement_tool import collect_summaries
+
+METRICS = ("cyclomatic", "fan_in", "fan_out")
+
+
+class AnalysisState:
+    """
+    Summaries of every file plus the call graph built from them.
+    The graph is updated per file: a changed file's functions are dropped
+    and added again, and only the callers of the names it defined before
+    or defines now are resolved again (by the rule of build_call_graph).
+    Node ids are never reused.
+    """
+
+    def __init__(self, repo, jobs=1, backend="heuristic"):
+        self.repo = repo
+        self.backend = backend
+        self.lock = threading.RLock()
+        self.summaries = {}
+        self.updated = time.time()
+        self.functions = {}     # node id -> (file, name, line, cc, ploc, lloc, end_line, ploc, lloc of the function)
+        self.node_calls = {}    # node id -> names it calls
+        self.file_nodes = {}    # file -> node ids
+        self.by_name = {}       # name -> node ids
+        self.defs_by_file = {}  # (file, key) -> node ids
+        self.defs_by_dir = {}   # (directory, key) -> non-local node ids
+        self.defs_by_key = {}   # key -> non-local node ids
+        self.callers_of = {}    # called name -> node ids calling it
+        self.callees = {}       # node id -> resolved callee ids
+        self.callers = {}       # node id -> caller ids
+        self.num_edges = 0
+        self.next_node = 0
+        files = list(get_source_files(repo))
+        added = []
+        for summary in collect_summaries(files, jobs, backend=backend):
+            if summary is not None:
+                self.summaries[summary["file"]] = summary
+                added.extend(self._add_file(summary, set()))
+        self._resolve(added)
+
+    def update_files(self, paths):
+        """
+        Re-analyze changed files, drop deleted ones. Returns the number of files touched.
+        """
+        touched = 0
+        with self.lock:
+            affected = set()   # definition keys that appeared or disappeared
+            added = []
+            for path in paths:
+                if os.path.splitext(path)[1] not in SUPPORTED_EXTENSIONS:
+                    continue
+                try:
+                    summary = analyze_source(path, backend=self.backend) if os.path.isfile(path) else None
+                except OSError:
+                    summary = None
+                old = self.summaries.pop(path, None)
+                if old is not None:
+                    if summary is not None and summary["digest"] == old["digest"]:
+                        # Saved without a change
+                        self.summaries[path] = old
+                        continue
+                    self._remove_file(path, affected)
+                if summary is not None:
+                    self.summaries[path] = summary
+                    added.extend(self._add_file(summary, affected))
+                if old is not None or summary is not None:
+                    touched += 1
+            if touched:
+                pending = set(added)
+                for key in affected:
+                    pending.update(self.callers_of.get(key, ()))
+                self._resolve(sorted(pending))
+                self.updated = time.time()
+        return touched
+
+    def _add_file(self, summary, affected):
+        file_path = summary["file"]
+        directory = os.path.dirname(file_path)
+        nodes = []
+        spans = zip(summary["functions"], summary["lines"], summary["end_lines"], summary["cyclomatic"],
+                    summary["func_ploc"], summary["func_lloc"], summary["local"], summary["calls"])
+        for name, line, end_line, cc, func_ploc, func_lloc, is_local, calls in spans:
+            node = self.next_node
+            self.next_node += 1
+            nodes.append(node)
+            self.functions[node] = (file_path, name, line, cc, summary["ploc"], summary["lloc"],
+                                    end_line, func_ploc, func_lloc)
+            self.node_calls[node] = calls
+            self.by_name.setdefault(name, []).append(node)
+            for callee in calls:
+                self.callers_of.setdefault(callee, set()).add(node)
+            for key in definition_keys(name):
+                affected.add(key)
+                self.defs_by_file.setdefault((file_path, key), []).append(node)
+                if not is_local:
+                    self.defs_by_dir.setdefault((directory, key), []).append(node)
+                    self.defs_by_key.setdefault(key, []).append(node)
+        self.file_nodes[file_path] = nodes
+        return nodes
+
+    def _remove_file(self, file_path, affected):
+        # Edges into the removed nodes go when their callers are resolved again
+        directory = os.path.dirname(file_path)
+        for node in self.file_nodes.pop(file_path, ()):
+            name = self.functions.pop(node)[1]
+            _discard(self.by_name, name, node)
+            for callee in self.node_calls.pop(node):
+                _discard(self.callers_of, callee, node)
+            for key in definition_keys(name):
+                affected.add(key)
+                _discard(self.defs_by_file, (file_path, key), node)
+                _discard(self.defs_by_dir, (directory, key), node)
+                _discard(self.defs_by_key, key, node)
+            self._set_callees(node, ())
+
+    def _resolve(self, nodes):
+        for node in nodes:
+            function = self.functions.get(node)
+            if function is None:
+                continue
+            file_path, name = function[:2]
+            directory = os.path.dirname(file_path)
+            short = name.rpartition(".")[2]
+            resolved = {}
+            for callee in self.node_calls[node]:
+                if callee == name or callee == short:
+                    continue
+                candidates = resolve_call(callee, file_path, directory,
+                                          self.defs_by_file, self.defs_by_dir, self.defs_by_key)
+                resolved.update(dict.fromkeys(candidates or ()))
+            self._set_callees(node, tuple(resolved))
+
+    def _set_callees(self, node, targets):
+        for target in self.callees.pop(node, ()):
+            _discard(self.callers, target, node)
+            self.num_edges -= 1
+        if targets:
+            self.callees[node] = targets
+            for target in targets:
+                self.callers.setdefault(target, set()).add(node)
+            self.num_edges += len(targets)
+
+    def fan_in(self, node):
+        return len(self.callers.get(node, ()))
+
+    def fan_out(self, node):
+        return len(self.callees.get(node, ()))
+
+    def _row(self, node):
+        file_path, name, line, cc, ploc, lloc, end_line, func_ploc, func_lloc = self.functions[node]
+        return {
+            "file": file_path, "function": name, "line": line, "line_end": end_line,
+            "ploc_file": ploc, "lloc_file": lloc, "cyclomatic": cc,
+            "ploc_function": func_ploc, "lloc_function": func_lloc,
+            "fan_in": self.fan_in(node), "fan_out": self.fan_out(node),
+        }
+
+    # ---------- Queries ----------
+
+    def query_function(self, name, file=None):
+        with self.lock:
+            nodes = self.by_name.get(name, [])
+            return [self._row(n) for n in nodes if file is None or self.functions[n][0] == file]
+
+    def query_file(self, path):
+        with self.lock:
+            return [self._row(n) for n in self.file_nodes.get(path, [])]
+
+    def query_top(self, metric="cyclomatic", n=20, dir=None):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of {', '.join(METRICS)}")
+        with self.lock:
+            nodes = self.functions
+            if dir:
+                prefix = os.path.join(dir, "")
+                nodes = [i for i, function in self.functions.items() if function[0].startswith(prefix)]
+            if metric == "cyclomatic":
+                key = lambda i: self.functions[i][3]
+            elif metric == "fan_in":
+                key = self.fan_in
+            else:
+                key = self.fan_out
+            return [self._row(i) for i in heapq.nlargest(n, nodes, key=key)]
+
+    def query_stats(self):
+        with self.lock:
+            return {
+                "files": len(self.summaries),
+                "functions": len(self.functions),
+                "calls": self.num_edges,
+                "updated": self.updated,
+            }
+
+
+def _discard(index, key, value):
+    # Drop value from a list/set index entry, and the entry once it is empty
+    values = index.get(key)
+    if values is not None and value in values:
+        values.remove(value)
+        if not values:
+            del index[key]
+
+
+# ---------- File watching ----------
+
+class PollingWatcher:
+    """
+    Detects changes by re-scanning the tree and comparing (size, mtime).
+    """
+
+    def __init__(self, repo, interval=2.0):
+        self.repo = repo
+        self.interval = interval
+        self.snapshot = self._stat_all()
+
+    def _stat_all(self):
+        stats = {}
+        for path in get_source_files(self.repo):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stats[path] = (st.st_size, st.st_mtime_ns)
+        return stats
+
+    def wait(self):
+        time.sleep(self.interval)
+        current = self._stat_all()
+        changed = {p for p, s in current.items() if self.snapshot.get(p) != s}
+        changed.update(p for p in self.snapshot if p not in current)
+        self.snapshot = current
+        return changed
+
+
+class InotifyWatcher:
+    """
+    Linux inotify through libc (no extra dependency). Every directory gets
+    a watch; new directories are added as they appear. A directory moved
+    out or deleted is reported as its path with a trailing separator.
+    On queue overflow, or when a new directory cannot be watched, the
+    caller is told to rescan everything (returns None).
+    """
+    IN_MODIFY = 0x2
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, repo):
+        libname = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libname:
+            raise OSError("inotify is not available")
+        self.libc = ctypes.CDLL(libname, use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+        self._watch_tree(repo)
+
+    def _watch_tree(self, root):
+        for dir_path, dirs, _ in os.walk(root):
+            dirs[:] = [d for d in dirs if d not in SKIPPED_DIRS]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), self.MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {dir_path}")
+            self.dirs[wd] = dir_path
+
+    def _unwatch_tree(self, root):
+        # Watches of a moved directory keep firing under its old path
+        prefix = os.path.join(root, "")
+        for wd, dir_path in list(self.dirs.items()):
+            if dir_path == root or dir_path.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.dirs[wd]
+
+    def wait(self, timeout=1.0):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        # Let a burst of writes settle before reading the events
+        time.sleep(0.05)
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, length = self.EVENT.unpack_from(data, pos)
+                name = data[pos + self.EVENT.size:pos + self.EVENT.size + length].rstrip(b"\0")
+                pos += self.EVENT.size + length
+                if mask & self.IN_Q_OVERFLOW:
+                    return None
+                dir_path = self.dirs.get(wd)
+                if dir_path is None:
+                    continue
+                path = os.path.join(dir_path, os.fsdecode(name))
+                if mask & self.IN_ISDIR:
+                    if os.path.basename(path) in SKIPPED_DIRS:
+                        continue
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                        try:
+                            self._watch_tree(path)
+                        except OSError:
+                            return None
+                        changed.update(get_source_files(path))
+                    elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                        self._unwatch_tree(path)
+                        changed.add(os.path.join(path, ""))
+                    continue
+                changed.add(path)
+        return changed
+
+
+def watch_loop(state, watcher, log):
+    while True:
+        changed = watcher.wait()
+        if changed is None:
+            # Lost events: compare everything against the tree
+            changed = set(get_source_files(state.repo)) | set(state.summaries)
+        removed_dirs = {path for path in changed if path.endswith(os.sep)}
+        if removed_dirs:
+            # Files of a vanished directory produce no events of their own
+            changed -= removed_dirs
+            with state.lock:
+                changed.update(path for path in state.summaries if path.startswith(tuple(removed_dirs)))
+        if changed:
+            touched = state.update_files(sorted(changed))
+            if touched:
+                log(f"{touched} files re-analyzed")
+
+
+# ---------- JSON-RPC ----------
+
+def handle_request(state, request):
+    """
+    Dispatch one JSON-RPC request (dict) and return the response dict.
+    """
+    if not isinstance(request, dict):
+        return {"id": None, "error": {"code": -32600, "message": "Invalid request: expected a JSON object"}}
+    req_id = request.get("id")
+    method = request.get("method")
+    params = request.get("params") or {}
+    if not isinstance(params, dict):
+        return {"id": req_id, "error": {"code": -32602, "message": "Invalid params: expected a JSON object"}}
+    try:
+        if method == "function":
+            result = state.query_function(params["name"], params.get("file"))
+        elif method == "file":
+            result = state.query_file(params["path"])
+        elif method == "top":
+            result = state.query_top(params.get("metric", "cyclomatic"), int(params.get("n", 20)),
+                                     params.get("dir"))
+        elif method == "stats":
+            result = state.query_stats()
+        elif method == "refresh":
+            result = {"files": state.update_files(list(get_source_files(state.repo)) + list(state.summaries))}
+        else:
+            return {"id": req_id, "error": {"code": -32601, "message": f"Unknown method {method!r}"}}
+    except (KeyError, TypeError, ValueError) as e:
+        return {"id": req_id, "error": {"code": -32602, "message": f"Invalid params: {e}"}}
+    return {"id": req_id, "result": result}
+
+
+def serve_lines(state, lines, write):
+    """
+    Answer line-delimited JSON-RPC requests until EOF or "shutdown".
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            write({"id": None, "error": {"code": -32700, "message": f"Parse error: {e}"}})
+            continue
+        if isinstance(request, dict) and request.get("method") == "shutdown":
+            write({"id": request.get("id"), "result": "bye"})
+            return False
+        write(handle_request(state, request))
+    return True
+
+
+def serve_socket(state, socket_path, log):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            def write(response):
+                self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                self.wfile.flush()
+            lines = (raw.decode("utf-8", errors="ignore") for raw in self.rfile)
+            if not serve_lines(state, lines, write):
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    if os.path.exists(socket_path):
+        if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+            raise OSError(f"{socket_path} exists and is not a socket")
+        os.unlink(socket_path)
+    with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as server:
+        server.daemon_threads = True
+        log(f"Listening on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve metrics queries and re-analyze files as they change.")
+    parser.add_argument("--repo", type=str, required=True, help="Path to repo")
+    parser.add_argument("--socket", type=str, default=None,
+                        help="Unix socket to listen on (default: JSON-RPC on stdin/stdout)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes for the initial analysis (default: CPU count)")
+    parser.add_argument("--backend", choices=BACKENDS, default="heuristic",
+                        help="Analyzer backend, as in measurement_tool.py (default: heuristic)")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="Seconds between scans when polling (default: 2)")
+    parser.add_argument("--no-inotify", action="store_true", help="Always poll instead of using inotify")
+    args = parser.parse_args()
+
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    state = AnalysisState(args.repo, args.jobs, args.backend)
+    log(f"{len(state.summaries)} files analyzed in {time.perf_counter() - start:.1f} s")
+
+    watcher = None
+    if not args.no_inotify:
+        try:
+            watcher = InotifyWatcher(args.repo)
+            log("Watching with inotify")
+        except OSError as e:
+            log(f"inotify unavailable ({e}), polling every {args.poll_interval} s")
+    if watcher is None:
+        watcher = PollingWatcher(args.repo, args.poll_interval)
+    threading.Thread(target=watch_loop, args=(state, watcher, log), daemon=True).start()
+
+    if args.socket:
+        try:
+            serve_socket(state, args.socket, log)
+        except OSError as e:
+            parser.error(str(e))
+    else:
+        def write(response):
+            sys.stdout.write(json.dumps(response) + "\n")
+            sys.stdout.flush()
+        serve_lines(state, sys.stdin, write)
+
+
+if __name__ == "__main__":
+    main()
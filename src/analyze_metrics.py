@@ -1,70 +1,217 @@
-import csv
-from collections import defaultdict
-
-# Path to CSV results file
-CSV_FILE = "results_jdk.csv"  
-
-# Store file-level metrics
-ploc_per_file = {}
-lloc_per_file = {}
-
-# Store function-level metrics
-cyclomatic_values = []
-fan_in_values = []
-fan_out_values = []
-
-with open(CSV_FILE, newline='', encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        file = row["file"]
-
-        # Convert safely to int 
-        ploc = int(row["ploc_file"]) if row["ploc_file"] else 0
-        lloc = int(row["lloc_file"]) if row["lloc_file"] else 0
-        cc   = int(row["cyclomatic"]) if row["cyclomatic"] else 0
-        fi   = int(row["fan_in"]) if row["fan_in"] else 0
-        fo   = int(row["fan_out"]) if row["fan_out"] else 0
-
-        # Collect PLOC/LLOC per file
-        if file not in ploc_per_file:
-            ploc_per_file[file] = ploc
-        if file not in lloc_per_file:
-            lloc_per_file[file] = lloc
-
-        # Function-level metrics
-        cyclomatic_values.append(cc)
-        fan_in_values.append(fi)
-        fan_out_values.append(fo)
-
-# ---------- Aggregate ----------
-total_ploc = sum(ploc_per_file.values())
-total_lloc = sum(lloc_per_file.values())
-
-total_cc = sum(cyclomatic_values)
-avg_cc = total_cc / len(cyclomatic_values) if cyclomatic_values else 0
-
-total_fan_in = sum(fan_in_values)
-total_fan_out = sum(fan_out_values)
-
-avg_fan_in = total_fan_in / len(fan_in_values) if fan_in_values else 0
-avg_fan_out = total_fan_out / len(fan_out_values) if fan_out_values else 0
-
-max_fan_in = max(fan_in_values) if fan_in_values else 0
-max_fan_out = max(fan_out_values) if fan_out_values else 0
-
-# ---------- Display ----------
-print("Aggregate Metrics Summary")
-print("────────────────────────────")
-print(f"Total PLOC: {total_ploc:,}")
-print(f"Total LLOC: {total_lloc:,}")
-print()
-print(f"Total Cyclomatic Complexity: {total_cc:,}")
-print(f"Average Cyclomatic Complexity per function: {avg_cc:.2f}")
-print()
-print(f"Total Fan-out: {total_fan_out:,}")
-print(f"Average Fan-out per function: {avg_fan_out:.2f}")
-print(f"Max Fan-out (most dependent function): {max_fan_out}")
-print()
-print(f"Total Fan-in: {total_fan_in:,}")
-print(f"Average Fan-in per function: {avg_fan_in:.2f}")
-print(f"Max Fan-in (most reused function): {max_fan_in}")
+import argparse
+import json
+import os
+
+import numpy as np
+
+from results_io import load_results
+
+METRICS = ["cyclomatic", "fan_in", "fan_out"]
+PERCENTILES = [50, 90, 95, 99]
+
+
+def load(path):
+    """
+    Load one results file (CSV or npz) into column arrays.
+    """
+    return load_results(path)
+
+
+def aggregate(results):
+    """
+    Repository-wide totals, averages, maxima and percentiles.
+    """
+    n_functions = len(results["func_file"])
+    summary = {
+        "files": len(results["files"]),
+        "functions": n_functions,
+        "total_ploc": int(results["file_ploc"].sum()),
+        "total_lloc": int(results["file_lloc"].sum()),
+    }
+    for metric in METRICS:
+        values = results[metric]
+        summary[f"total_{metric}"] = int(values.sum())
+        summary[f"avg_{metric}"] = float(values.mean()) if n_functions else 0.0
+        summary[f"max_{metric}"] = int(values.max()) if n_functions else 0
+        pct = np.percentile(values, PERCENTILES) if n_functions else [0] * len(PERCENTILES)
+        summary[f"percentiles_{metric}"] = {f"p{p}": float(v) for p, v in zip(PERCENTILES, pct)}
+    return summary
+
+
+def histogram(results, metric, bins=10):
+    """
+    (counts, bin_edges) of a function-level metric.
+    """
+    counts, edges = np.histogram(results[metric], bins=bins)
+    return counts.tolist(), edges.tolist()
+
+
+def group_labels(results, by="language", depth=1):
+    """
+    Group label per file and the list of distinct labels.
+    by: "language" or "directory" (first `depth` directory components).
+    """
+    if by == "language":
+        return results["file_language"].astype(np.int64), list(results["languages"])
+    if by != "directory":
+        raise ValueError(f"Unknown grouping {by!r}, expected 'language' or 'directory'")
+
+    label_ids = {}
+    file_group = np.empty(len(results["files"]), dtype=np.int64)
+    for i, file_path in enumerate(results["files"]):
+        parts = os.path.dirname(file_path).replace(os.sep, "/").split("/")
+        label = "/".join(parts[:depth]) or "."
+        file_group[i] = label_ids.setdefault(label, len(label_ids))
+    return file_group, list(label_ids)
+
+
+def group_by(results, by="language", depth=1):
+    """
+    Per-group aggregates: files, functions, PLOC, LLOC and total/average/max
+    of every function-level metric.
+    """
+    file_group, labels = group_labels(results, by, depth)
+    n_groups = len(labels)
+    func_group = file_group[results["func_file"]]
+
+    files = np.bincount(file_group, minlength=n_groups)
+    functions = np.bincount(func_group, minlength=n_groups)
+    groups = {
+        "files": files,
+        "functions": functions,
+        "ploc": np.bincount(file_group, weights=results["file_ploc"], minlength=n_groups),
+        "lloc": np.bincount(file_group, weights=results["file_lloc"], minlength=n_groups),
+    }
+    for metric in METRICS:
+        values = results[metric]
+        total = np.bincount(func_group, weights=values, minlength=n_groups)
+        maximum = np.zeros(n_groups, dtype=np.int64)
+        np.maximum.at(maximum, func_group, values)
+        groups[f"total_{metric}"] = total
+        groups[f"avg_{metric}"] = np.divide(total, functions, out=np.zeros(n_groups), where=functions > 0)
+        groups[f"max_{metric}"] = maximum
+
+    rows = []
+    for g, label in enumerate(labels):
+        row = {"group": label}
+        for key, column in groups.items():
+            value = column[g]
+            row[key] = float(value) if key.startswith("avg_") else int(value)
+        rows.append(row)
+    return rows
+
+
+def top_n(results, metric="cyclomatic", n=10):
+    """
+    The n functions with the highest value of metric, as dicts.
+    """
+    values = results[metric]
+    n = min(n, len(values))
+    if n == 0:
+        return []
+    idx = np.argpartition(-values, n - 1)[:n]
+    idx = idx[np.lexsort((idx, -values[idx]))]
+    return [{
+        "file": results["files"][results["func_file"][i]],
+        "function": results["function_names"][results["func_name"][i]],
+        metric: int(values[i]),
+    } for i in idx]
+
+
+def print_summary(summary, title="Aggregate Metrics Summary"):
+    print(title)
+    print("────────────────────────────")
+    print(f"Total PLOC: {summary['total_ploc']:,}")
+    print(f"Total LLOC: {summary['total_lloc']:,}")
+    print()
+    print(f"Total Cyclomatic Complexity: {summary['total_cyclomatic']:,}")
+    print(f"Average Cyclomatic Complexity per function: {summary['avg_cyclomatic']:.2f}")
+    print()
+    print(f"Total Fan-out: {summary['total_fan_out']:,}")
+    print(f"Average Fan-out per function: {summary['avg_fan_out']:.2f}")
+    print(f"Max Fan-out (most dependent function): {summary['max_fan_out']}")
+    print()
+    print(f"Total Fan-in: {summary['total_fan_in']:,}")
+    print(f"Average Fan-in per function: {summary['avg_fan_in']:.2f}")
+    print(f"Max Fan-in (most reused function): {summary['max_fan_in']}")
+    print()
+    for metric in METRICS:
+        pct = ", ".join(f"{k} {v:g}" for k, v in summary[f"percentiles_{metric}"].items())
+        print(f"Percentiles {metric}: {pct}")
+
+
+def print_comparison(summaries):
+    keys = ["files", "functions", "total_ploc", "total_lloc", "avg_cyclomatic",
+            "max_cyclomatic", "avg_fan_in", "max_fan_in", "avg_fan_out", "max_fan_out"]
+    names = list(summaries)
+    width = max(12, *(len(os.path.basename(n)) for n in names))
+    print(f"{'':16}" + "".join(f"{os.path.basename(n):>{width + 2}}" for n in names))
+    for key in keys:
+        cells = []
+        for n in names:
+            v = summaries[n][key]
+            cells.append(f"{v:>{width + 2}.2f}" if isinstance(v, float) else f"{v:>{width + 2},}")
+        print(f"{key:16}" + "".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate metrics of one or more results files (CSV or npz).")
+    parser.add_argument("results", nargs="+", help="Results files produced by measurement_tool.py")
+    parser.add_argument("--group-by", choices=["language", "directory"], default=None,
+                        help="Also aggregate per language or per directory")
+    parser.add_argument("--dir-depth", type=int, default=1,
+                        help="Directory components used by --group-by directory (default: 1)")
+    parser.add_argument("--top", type=int, default=0, metavar="N", help="List the top N hotspot functions")
+    parser.add_argument("--metric", choices=METRICS, default="cyclomatic",
+                        help="Metric for --top and --histogram (default: cyclomatic)")
+    parser.add_argument("--histogram", type=int, default=0, metavar="BINS",
+                        help="Print a histogram of --metric with this many bins")
+    parser.add_argument("--json", type=str, default=None, help="Also write all computed aggregates as JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for path in args.results:
+        results = load(path)
+        entry = {"summary": aggregate(results)}
+        if len(args.results) == 1:
+            print_summary(entry["summary"])
+        else:
+            print(f"== {path}")
+
+        if args.group_by:
+            entry["groups"] = group_by(results, args.group_by, args.dir_depth)
+            print()
+            print(f"{args.group_by:24} {'files':>8} {'functions':>10} {'PLOC':>12} {'LLOC':>12} "
+                  f"{'avg CC':>8} {'max CC':>8}")
+            for row in sorted(entry["groups"], key=lambda r: -r["ploc"]):
+                print(f"{row['group'][:24]:24} {row['files']:8,} {row['functions']:10,} {row['ploc']:12,} "
+                      f"{row['lloc']:12,} {row['avg_cyclomatic']:8.2f} {row['max_cyclomatic']:8,}")
+
+        if args.histogram:
+            counts, edges = histogram(results, args.metric, args.histogram)
+            entry["histogram"] = {"metric": args.metric, "counts": counts, "edges": edges}
+            print()
+            print(f"Histogram {args.metric}:")
+            for count, lo, hi in zip(counts, edges, edges[1:]):
+                print(f"  {lo:8.1f} - {hi:8.1f}: {count:,}")
+
+        if args.top:
+            entry["top"] = top_n(results, args.metric, args.top)
+            print()
+            print(f"Top {args.top} {args.metric}:")
+            for item in entry["top"]:
+                print(f"  {item[args.metric]:6}  {item['function']}  ({item['file']})")
+        report[path] = entry
+        print()
+
+    if len(args.results) > 1:
+        print_comparison({p: e["summary"] for p, e in report.items()})
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import csv
+from array import array
+from itertools import accumulate
+
+
+class CallGraph:
+    """
+    Caller -> callee graph with functions interned to integer ids.
+    Nodes are (file, function, line) definitions.
+    Edges are stored CSR-style in flat arrays, once by caller (out) and
+    once by callee (in), so fan-in/fan-out are plain degree counts.
+    """
+
+    def __init__(self, nodes, sources, targets):
+        self.nodes = nodes
+        self._ids = None
+        n = len(nodes)
+        self.out_offsets, self.out_targets = _build_csr(n, sources, targets)
+        self.in_offsets, self.in_sources = _build_csr(n, targets, sources)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def num_edges(self):
+        return len(self.out_targets)
+
+    def node_id(self, node):
+        """
+        Integer id of a (file, function, line) node, or None.
+        """
+        if self._ids is None:
+            self._ids = {key: i for i, key in enumerate(self.nodes)}
+        return self._ids.get(node)
+
+    def callees(self, node):
+        return self.out_targets[self.out_offsets[node]:self.out_offsets[node + 1]]
+
+    def callers(self, node):
+        return self.in_sources[self.in_offsets[node]:self.in_offsets[node + 1]]
+
+    # Alias, outgoing neighbors
+    neighbors = callees
+
+    def fan_out(self, node):
+        return self.out_offsets[node + 1] - self.out_offsets[node]
+
+    def fan_in(self, node):
+        return self.in_offsets[node + 1] - self.in_offsets[node]
+
+    def fan_out_degrees(self):
+        offs = self.out_offsets
+        return array("q", (offs[i + 1] - offs[i] for i in range(len(self.nodes))))
+
+    def fan_in_degrees(self):
+        offs = self.in_offsets
+        return array("q", (offs[i + 1] - offs[i] for i in range(len(self.nodes))))
+
+    def edges(self):
+        """
+        Yield (caller_id, callee_id) pairs.
+        """
+        offs = self.out_offsets
+        for node in range(len(self.nodes)):
+            for target in self.out_targets[offs[node]:offs[node + 1]]:
+                yield node, target
+
+    def write_edges_csv(self, output_file):
+        """
+        Export the graph as a caller,callee edge list.
+        """
+        nodes = self.nodes
+        with open(output_file, mode="w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["caller_file", "caller", "caller_line",
+                             "callee_file", "callee", "callee_line"])
+            writer.writerows(nodes[s] + nodes[t] for s, t in self.edges())
+
+
+def _build_csr(n, sources, targets):
+    """
+    Counting sort of the edges by source: offsets[i]:offsets[i + 1]
+    indexes the targets of node i.
+    """
+    counts = array("q", bytes(8 * (n + 1)))
+    for s in sources:
+        counts[s + 1] += 1
+    offsets = array("q", accumulate(counts))
+    fill = array("q", offsets)
+    adjacency = array("i", bytes(4 * len(sources)))
+    for s, t in zip(sources, targets):
+        adjacency[fill[s]] = t
+        fill[s] += 1
+    return offsets, adjacency
@@ -1,27 +1,230 @@
 import os
+import re
+from fnmatch import fnmatch
+
+from language_rules import EXTENSIONS
 
 # Supported extensions for main languages
-SUPPORTED_EXTENSIONS = {
-    ".py": "python",
-    ".c": "c",
-    ".h": "c",
-    ".cpp": "cpp",
-    ".hpp": "cpp",
-    ".java": "java",
-    ".go": "go",
-    ".rs": "rust",
-}
-
-def get_source_files(path):
-    files_to_analyze = []
+SUPPORTED_EXTENSIONS = EXTENSIONS
+
+# Version control metadata never contains sources to analyze
+SKIPPED_DIRS = {".git", ".hg", ".svn"}
+
+# Markers of generated files, searched (case-insensitive) in the file head
+GENERATED_MARKERS = re.compile(rb"@generated|do not edit|generated by|autogenerated|auto-generated",
+                               re.IGNORECASE)
+HEAD_BYTES = 8192
+
+
+def get_source_files(path, include=(), exclude=(), gitignore=False, max_size=None,
+                     skip_binary=False, skip_generated=False, threads=1):
+    """
+    Yield the supported source files below path (or path itself if it is a file),
+    in the same order as a top-down os.walk.
+
+    include / exclude: glob patterns matched against the path relative to
+    path and against the base name (exclude also prunes directories).
+    gitignore: honour .gitignore files found during the walk.
+    max_size: skip files larger than this many bytes.
+    skip_binary / skip_generated: look at the file head and skip binary
+    (NUL bytes) or generated files.
+    threads: directories are listed by this many threads ahead of the
+    consumer, useful on network filesystems.
+    """
     if os.path.isfile(path):
         ext = os.path.splitext(path)[1]
         if ext in SUPPORTED_EXTENSIONS:
-            files_to_analyze.append(path)
-    else:
-        for root, _, files in os.walk(path):
-            for f in files:
-                ext = os.path.splitext(f)[1]
-                if ext in SUPPORTED_EXTENSIONS:
-                    files_to_analyze.append(os.path.join(root, f))
-    return files_to_analyze
+            yield path
+        return
+
+    options = {
+        "root": path,
+        "include": list(include or ()),
+        "exclude": list(exclude or ()),
+        "gitignore": gitignore,
+        "max_size": max_size,
+        "skip_binary": skip_binary,
+        "skip_generated": skip_generated,
+    }
+
+    if threads <= 1:
+        stack = [(path, [])]
+        while stack:
+            files, subdirs = _scan_dir(stack.pop(), options)
+            yield from files
+            stack.extend(reversed(subdirs))
+        return
+
+    # Listings run ahead in the pool, results are consumed in walk order
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        stack = [executor.submit(_scan_dir, (path, []), options)]
+        while stack:
+            files, subdirs = stack.pop().result()
+            yield from files
+            stack.extend(reversed([executor.submit(_scan_dir, d, options) for d in subdirs]))
+
+
+def _scan_dir(item, options):
+    """
+    List one directory. Returns the accepted source files and the
+    (subdirectory, gitignore rules) pairs to descend into.
+    """
+    dir_path, rules = item
+    try:
+        with os.scandir(dir_path) as it:
+            entries = list(it)
+    except OSError:
+        return [], []
+
+    if options["gitignore"]:
+        rules = rules + _read_gitignore(dir_path)
+
+    files = []
+    subdirs = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+
+        if is_dir:
+            # Symlinked directories are not followed, like os.walk
+            if entry.name in SKIPPED_DIRS or entry.is_symlink():
+                continue
+            if _matches_any(entry, options["exclude"], options) or _ignored(entry.path, True, rules):
+                continue
+            subdirs.append((entry.path, rules))
+            continue
+
+        if os.path.splitext(entry.name)[1] not in SUPPORTED_EXTENSIONS:
+            continue
+        if options["include"] and not _matches_any(entry, options["include"], options):
+            continue
+        if _matches_any(entry, options["exclude"], options) or _ignored(entry.path, False, rules):
+            continue
+        if not _accept_content(entry, options):
+            continue
+        files.append(os.path.join(dir_path, entry.name))
+
+    return files, subdirs
+
+
+def _matches_any(entry, patterns, options):
+    if not patterns:
+        return False
+    rel = os.path.relpath(entry.path, options["root"]).replace(os.sep, "/")
+    return any(fnmatch(rel, p) or fnmatch(entry.name, p) for p in patterns)
+
+
+def _accept_content(entry, options):
+    if options["max_size"] is not None:
+        try:
+            if entry.stat().st_size > options["max_size"]:
+                return False
+        except OSError:
+            return False
+    if not (options["skip_binary"] or options["skip_generated"]):
+        return True
+    try:
+        with open(entry.path, "rb") as f:
+            head = f.read(HEAD_BYTES)
+    except OSError:
+        return False
+    if options["skip_binary"] and b"\0" in head:
+        return False
+    if options["skip_generated"] and GENERATED_MARKERS.search(head):
+        return False
+    return True
+
+
+# ---------- .gitignore support ----------
+
+def _read_gitignore(dir_path):
+    try:
+        with open(os.path.join(dir_path, ".gitignore"), "r", encoding="utf-8", errors="ignore") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    rules = []
+    for line in lines:
+        rule = _compile_gitignore_rule(dir_path, line)
+        if rule is not None:
+            rules.append(rule)
+    return rules
+
+
+def _compile_gitignore_rule(base, line):
+    """
+    (base, regex, negate, dir_only, anchored) for one .gitignore line.
+    Anchored patterns (containing '/') match the path relative to base,
+    the others match the base name.
+    """
+    line = line.rstrip()
+    if not line or line.startswith("#"):
+        return None
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    elif line.startswith("\\"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    anchored = "/" in line
+    line = line.lstrip("/")
+    if not line:
+        return None
+    return base, re.compile(_glob_to_regex(line)), negate, dir_only, anchored
+
+
+def _glob_to_regex(pattern):
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("(?:/.*)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape("["))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body + "]")
+                i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out) + r"\Z"
+
+
+def _ignored(path, is_dir, rules):
+    """
+    The last matching rule wins; a negated rule re-includes the path.
+    """
+    ignored = False
+    for base, regex, negate, dir_only, anchored in rules:
+        if dir_only and not is_dir:
+            continue
+        if anchored:
+            target = os.path.relpath(path, base).replace(os.sep, "/")
+        else:
+            target = os.path.basename(path)
+        if regex.match(target):
+            ignored = not negate
+    return ignored
@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import sys
+
+from loc_counter import content_digest
+
+INDEX_FORMAT = "function-index"
+INDEX_FORMAT_VERSION = 1
+
+
+def write_function_index(summaries, output_file):
+    """
+    Persist where every function lives: per file its size, content digest
+    and one [name, line_start, line_end, offset_start, offset_end] entry per
+    function (byte offsets into the file). Returns the number of functions.
+    """
+    files = {}
+    count = 0
+    for summary in summaries:
+        try:
+            size = os.path.getsize(summary["file"])
+        except OSError:
+            continue
+        spans = zip(summary["functions"], summary["lines"], summary["end_lines"],
+                    summary["start_offsets"], summary["end_offsets"])
+        files[summary["file"]] = {
+            "size": size,
+            "digest": summary["digest"],
+            "functions": [list(span) for span in spans],
+        }
+        count += len(summary["functions"])
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump({"format": INDEX_FORMAT, "version": INDEX_FORMAT_VERSION, "files": files},
+                  f, separators=(",", ":"))
+    return count
+
+
+def load_function_index(path):
+    """
+    {file: {"size", "digest", "functions"}} of an index file.
+    """
+    with open(path, encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("format") != INDEX_FORMAT or index.get("version") != INDEX_FORMAT_VERSION:
+        raise ValueError(f"{path} is not a function index of this version")
+    return index["files"]
+
+
+def lookup(files, name, file=None):
+    """
+    (file, [name, line_start, line_end, offset_start, offset_end]) of every
+    function called name (or Class.name), optionally only in one file.
+    """
+    found = []
+    for file_path, entry in files.items():
+        if file is not None and file_path != file:
+            continue
+        for function in entry["functions"]:
+            if function[0] == name or function[0].endswith("." + name):
+                found.append((file_path, function))
+    return found
+
+
+def read_function_source(file_path, entry, function, verify=False):
+    """
+    Source of one function (bytes) read by seeking to its offsets.
+    Raises ValueError if the file changed since the index was written:
+    always checked by size, by content digest with verify=True.
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size != entry["size"]:
+            raise ValueError(f"{file_path} changed since the index was written")
+        if verify and content_digest(f.read()) != entry["digest"]:
+            raise ValueError(f"{file_path} changed since the index was written")
+        _, _, _, offset_start, offset_end = function
+        f.seek(offset_start)
+        return f.read(offset_end - offset_start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the source of functions from a function index.")
+    parser.add_argument("index", help="Index written by measurement_tool.py --function-index")
+    parser.add_argument("function", help="Function name (Class.method or method)")
+    parser.add_argument("--file", type=str, default=None, help="Only this file")
+    parser.add_argument("--verify", action="store_true",
+                        help="Check the content digest of the file, not only its size")
+    args = parser.parse_args()
+
+    files = load_function_index(args.index)
+    found = lookup(files, args.function, args.file)
+    if not found:
+        print(f"No function {args.function!r} in the index.", file=sys.stderr)
+        sys.exit(1)
+    for file_path, function in found:
+        name, line_start, line_end = function[:3]
+        print(f"== {file_path}:{line_start}-{line_end} {name}")
+        try:
+            source = read_function_source(file_path, files[file_path], function, args.verify)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ {e}", file=sys.stderr)
+            continue
+        sys.stdout.write(source.decode("utf-8", errors="replace"))
+        if not source.endswith(b"\n"):
+            sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
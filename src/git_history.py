@@ -0,0 +1,249 @@
+import csv
+import os
+import posixpath
+import subprocess
+from functools import partial
+
+from git_incremental import _is_supported, _split_z, run_git
+from io_pipeline import DEFAULT_QUEUE_DEPTH, bounded_map
+from loc_counter import analyze_source, build_call_graph
+
+HISTORY_FIELDS = [
+    "revision", "date", "file", "function", "line",
+    "cyclomatic", "fan_in", "fan_out", "ploc_function", "lloc_function",
+]
+
+REVISION_FIELDS = [
+    "revision", "date", "files", "functions", "ploc", "lloc",
+    "total_cyclomatic", "avg_cyclomatic", "max_cyclomatic",
+    "avg_fan_in", "max_fan_in", "avg_fan_out", "max_fan_out",
+    "analyzed_files",
+]
+
+
+def resolve_revisions(repo, revisions, every=1):
+    """
+    Commits to measure, oldest first, as (hash, committer date) pairs.
+    A revision is a single rev or a range A..B (the first-parent commits
+    after A up to B); with every > 1 only every n-th commit of a range
+    is kept, its last commit always.
+    """
+    hashes = []
+    for rev in revisions:
+        if ".." in rev:
+            commits = run_git(repo, "rev-list", "--reverse", "--first-parent", rev).split()
+            if every > 1 and commits:
+                commits = commits[::-1][::every][::-1]
+            hashes.extend(commits)
+        else:
+            hashes.append(run_git(repo, "rev-parse", "--verify", rev + "^{commit}").strip())
+    # A commit named twice (HEAD~1 HEAD~1..HEAD HEAD) is measured once
+    hashes = list(dict.fromkeys(hashes))
+    if not hashes:
+        return []
+    dates = dict(line.split(" ", 1) for line in
+                 run_git(repo, "show", "-s", "--format=%H %cI", *hashes).splitlines() if line)
+    return [(h, dates.get(h, "")) for h in hashes]
+
+
+# Symlink hops followed before a link is given up (loops)
+MAX_SYMLINK_HOPS = 8
+
+
+def _tree_entries(repo, revision, *args):
+    for entry in _split_z(run_git(repo, "ls-tree", "-z", "--full-tree", revision, *args)):
+        meta, path = entry.split("\t", 1)
+        mode, kind, blob = meta.split()
+        yield mode, kind, blob, path
+
+
+def _resolve_symlink(repo, revision, path, blob):
+    """
+    Blob hash of the file a symlink (mode 120000) points to in the same
+    commit, like a checked out run reading through it, or None if it
+    leaves the tree, dangles or loops.
+    """
+    for _ in range(MAX_SYMLINK_HOPS):
+        target = run_git(repo, "cat-file", "blob", blob)
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(path), target))
+        if posixpath.isabs(target) or path == ".." or path.startswith("../"):
+            return None
+        found = [(mode, kind, blob) for mode, kind, blob, p in _tree_entries(repo, revision, "--", path) if p == path]
+        if not found or found[0][1] != "blob":
+            return None
+        mode, _, blob = found[0]
+        if mode != "120000":
+            return blob
+    return None
+
+
+def list_tree(repo, revision, paths=()):
+    """
+    (path, blob hash) of the supported files in a commit, read from the
+    object store (no checkout), in path order. A symlinked file has the
+    blob of its target.
+    """
+    entries = []
+    for mode, kind, blob, path in _tree_entries(repo, revision, "-r", "--", *paths):
+        if kind != "blob" or not _is_supported(path):
+            continue
+        if mode == "120000":
+            blob = _resolve_symlink(repo, revision, path, blob)
+            if blob is None:
+                continue
+        entries.append((path, blob))
+    return entries
+
+
+class BlobReader:
+    """
+    Blob contents through one long-running git cat-file --batch process.
+    """
+
+    def __init__(self, repo):
+        self.process = subprocess.Popen(["git", "-C", repo, "cat-file", "--batch"],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, blob):
+        self.process.stdin.write(blob.encode("ascii") + b"\n")
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+        if len(header) != 3 or header[1] != b"blob":
+            raise RuntimeError(f"git cat-file: {blob} is not a blob")
+        data = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1)  # trailing newline
+        return data
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+def _analyze_blob(path, data, backend="heuristic"):
+    return analyze_source(path, backend=backend, data=data)
+
+
+def _memo_key(path, blob):
+    # The extension decides the language and header rules of a blob
+    return blob, os.path.splitext(path)[1]
+
+
+def iter_revision_summaries(repo, revisions, jobs=1, backend="heuristic", paths=(),
+                            queue_depth=DEFAULT_QUEUE_DEPTH):
+    """
+    Yield (revision, date, summaries, analyzed) per revision, summaries in
+    path order with repo-relative file names. Summaries are memoized by
+    blob hash between consecutive revisions: only blobs that are new in a
+    revision are read and analyzed (analyzed counts them).
+    """
+    reader = BlobReader(repo)
+    executor = None
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=jobs)
+    memo = {}
+    try:
+        for revision, date in revisions:
+            entries = list_tree(repo, revision, paths)
+            current = {}
+            missing = []
+            for path, blob in entries:
+                key = _memo_key(path, blob)
+                if key in memo:
+                    current[key] = memo[key]
+                elif key not in current:
+                    current[key] = None
+                    missing.append((path, blob))
+
+            contents = ((path, reader.read(blob)) for path, blob in missing)
+            if executor is None:
+                analyzed = (_analyze_blob(path, data, backend) for path, data in contents)
+            else:
+                analyzed = bounded_map(executor, partial(_analyze_blob, backend=backend), contents, queue_depth)
+            for (path, blob), summary in zip(missing, analyzed):
+                current[_memo_key(path, blob)] = summary
+            # Only blobs of this revision are kept for the next one
+            memo = current
+
+            summaries = []
+            for path, blob in entries:
+                summary = memo[_memo_key(path, blob)]
+                if summary is not None:
+                    summaries.append(dict(summary, file=path))
+            yield revision, date, summaries, len(missing)
+    finally:
+        # Workers forked after cat-file started hold its stdin, they go first
+        if executor is not None:
+            executor.shutdown()
+        reader.close()
+
+
+def revision_rows(revision, date, summaries, graph):
+    """
+    Per-function rows of one revision, node order of the call graph.
+    """
+    node = 0
+    for summary in summaries:
+        spans = zip(summary["functions"], summary["lines"], summary["cyclomatic"],
+                    summary["func_ploc"], summary["func_lloc"])
+        for name, line, cc, func_ploc, func_lloc in spans:
+            yield [revision, date, summary["file"], name, line, cc,
+                   graph.fan_in(node), graph.fan_out(node), func_ploc, func_lloc]
+            node += 1
+
+
+def revision_aggregates(revision, date, summaries, graph, analyzed):
+    cyclomatic = [cc for summary in summaries for cc in summary["cyclomatic"]]
+    fan_in = graph.fan_in_degrees()
+    fan_out = graph.fan_out_degrees()
+    n = len(cyclomatic)
+    return {
+        "revision": revision,
+        "date": date,
+        "files": len(summaries),
+        "functions": n,
+        "ploc": sum(summary["ploc"] for summary in summaries),
+        "lloc": sum(summary["lloc"] for summary in summaries),
+        "total_cyclomatic": sum(cyclomatic),
+        "avg_cyclomatic": round(sum(cyclomatic) / n, 4) if n else 0.0,
+        "max_cyclomatic": max(cyclomatic, default=0),
+        "avg_fan_in": round(sum(fan_in) / n, 4) if n else 0.0,
+        "max_fan_in": max(fan_in, default=0),
+        "avg_fan_out": round(sum(fan_out) / n, 4) if n else 0.0,
+        "max_fan_out": max(fan_out, default=0),
+        "analyzed_files": analyzed,
+    }
+
+
+def write_history(repo, revisions, output_file, summary_file, jobs=1, backend="heuristic",
+                  paths=(), functions=True):
+    """
+    Measure every revision and stream the time series: one row per
+    function and revision to output_file (unless functions is False),
+    one aggregate row per revision to summary_file.
+    Returns the number of blobs analyzed.
+    """
+    total_analyzed = 0
+    function_file = open(output_file, "w", newline="", encoding="utf-8") if functions else None
+    try:
+        function_writer = None
+        if function_file is not None:
+            function_writer = csv.writer(function_file)
+            function_writer.writerow(HISTORY_FIELDS)
+        with open(summary_file, "w", newline="", encoding="utf-8") as f:
+            summary_writer = csv.DictWriter(f, fieldnames=REVISION_FIELDS)
+            summary_writer.writeheader()
+            for revision, date, summaries, analyzed in iter_revision_summaries(
+                    repo, revisions, jobs, backend, paths):
+                graph = build_call_graph(summaries)
+                if function_writer is not None:
+                    function_writer.writerows(revision_rows(revision, date, summaries, graph))
+                aggregates = revision_aggregates(revision, date, summaries, graph, analyzed)
+                summary_writer.writerow(aggregates)
+                total_analyzed += analyzed
+                print(f"{revision[:12]} {date}: {aggregates['files']} files, "
+                      f"{aggregates['functions']} functions, {analyzed} files analyzed")
+    finally:
+        if function_file is not None:
+            function_file.close()
+    return total_analyzed
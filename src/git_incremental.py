@@ -0,0 +1,134 @@
+import csv
+import os
+import subprocess
+
+from file_scanner import SUPPORTED_EXTENSIONS
+
+DELTA_FIELDS = [
+    "file", "function", "change",
+    "cyclomatic_old", "cyclomatic_new",
+    "fan_in_old", "fan_in_new",
+    "fan_out_old", "fan_out_new"
+]
+
+
+def run_git(repo, *args):
+    result = subprocess.run(["git", "-C", repo, *args],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed: {result.stderr.decode(errors='ignore').strip()}")
+    return result.stdout.decode("utf-8", errors="surrogateescape")
+
+
+def _split_z(output):
+    return [p for p in output.split("\0") if p]
+
+
+def _is_supported(rel_path):
+    return os.path.splitext(rel_path)[1] in SUPPORTED_EXTENSIONS
+
+
+def git_source_files(repo, include_untracked=False):
+    """
+    Supported source files known to git below repo (no directory walk).
+    Tracked files deleted from the working tree are left out.
+    """
+    deleted = set(_split_z(run_git(repo, "ls-files", "-z", "--deleted")))
+    rel_paths = [p for p in _split_z(run_git(repo, "ls-files", "-z")) if p not in deleted]
+    if include_untracked:
+        rel_paths += _split_z(run_git(repo, "ls-files", "-z", "--others", "--exclude-standard"))
+    return [os.path.join(repo, p) for p in rel_paths if _is_supported(p)]
+
+
+def git_changed_files(repo, since=None, diff=None):
+    """
+    Supported files changed since <rev> (against the working tree)
+    or between <rev1>..<rev2>. Paths are joined to repo like get_source_files.
+    File contents are read from the working tree, so rev2 has to be the
+    checked out commit (ValueError otherwise).
+    """
+    if diff is not None:
+        if ".." not in diff:
+            raise ValueError(f"--diff expects <rev1>..<rev2>, got {diff!r}")
+        rev1, rev2 = diff.split("..", 1)
+        revs = [rev1, rev2 or "HEAD"]
+        head = run_git(repo, "rev-parse", "--verify", "HEAD^{commit}").strip()
+        if run_git(repo, "rev-parse", "--verify", revs[1] + "^{commit}").strip() != head:
+            raise ValueError(f"--diff: {revs[1]} is not checked out, check it out first "
+                             f"(or use the history mode to measure revisions from the object store)")
+    else:
+        revs = [since]
+    rel_paths = _split_z(run_git(repo, "diff", "--name-only", "--no-renames", "--relative", "-z", *revs))
+    if diff is None:
+        rel_paths += _split_z(run_git(repo, "ls-files", "-z", "--others", "--exclude-standard"))
+    return {os.path.join(repo, p) for p in rel_paths if _is_supported(p)}
+
+
+def load_results_csv(path):
+    if not path or not os.path.isfile(path):
+        return []
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def order_like_previous(source_files, previous_rows):
+    """
+    Keep the file order of the previous results so the patched CSV only
+    differs where something changed; new files go to the end.
+    """
+    current = set(source_files)
+    ordered = []
+    seen = set()
+    for row in previous_rows:
+        f = row["file"]
+        if f in current and f not in seen:
+            ordered.append(f)
+            seen.add(f)
+    ordered.extend(f for f in source_files if f not in seen)
+    return ordered
+
+
+def _keyed(rows):
+    # A function name can appear more than once in a file (#ifdef variants)
+    keyed = {}
+    counts = {}
+    for row in rows:
+        base = (row["file"], row["function"])
+        n = counts.get(base, 0)
+        counts[base] = n + 1
+        keyed[base + (n,)] = row
+    return keyed
+
+
+def write_delta_report(previous_rows, new_rows, output_file):
+    """
+    Per-function CC and fan-in/fan-out changes between two result sets.
+    Returns the number of changed functions.
+    """
+    old = _keyed(previous_rows)
+    new = _keyed(new_rows)
+    metrics = ("cyclomatic", "fan_in", "fan_out")
+
+    deltas = []
+    for key in list(new) + [k for k in old if k not in new]:
+        o = old.get(key)
+        n = new.get(key)
+        if o is None:
+            change = "added"
+        elif n is None:
+            change = "removed"
+        elif any(str(o[m]) != str(n[m]) for m in metrics):
+            change = "modified"
+        else:
+            continue
+        delta = {"file": key[0], "function": key[1], "change": change}
+        for m in metrics:
+            delta[m + "_old"] = o[m] if o is not None else ""
+            delta[m + "_new"] = n[m] if n is not None else ""
+        deltas.append(delta)
+
+    with open(output_file, mode="w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=DELTA_FIELDS)
+        writer.writeheader()
+        writer.writerows(deltas)
+    return len(deltas)
@@ -0,0 +1,336 @@
+import csv
+from array import array
+from collections import deque
+from xml.sax.saxutils import escape, quoteattr
+
+# Columns of the graph metrics CSV
+GRAPH_METRICS_FIELDS = [
+    "file", "function", "line",
+    "transitive_fan_in", "transitive_fan_out",
+    "scc", "scc_size", "depth", "henry_kafura",
+]
+
+# Component ids per pass of the reachability bitsets (bounds their size)
+REACH_BLOCK_BITS = 1 << 16
+
+if hasattr(int, "bit_count"):  # Python 3.10+
+    _popcount = int.bit_count
+else:
+    def _popcount(bits):
+        return bin(bits).count("1")
+
+
+# ---------- Strongly connected components ----------
+
+def strongly_connected_components(graph):
+    """
+    Tarjan's algorithm with an explicit stack (no recursion limit on deep
+    call chains). Returns (component id per node, number of components).
+    Components are numbered in reverse topological order: every call
+    leaving a component goes to a component with a smaller id.
+    Components with more than one function are recursion cycles.
+    """
+    n = len(graph)
+    offsets, targets = graph.out_offsets, graph.out_targets
+    index = array("i", [-1]) * n
+    low = array("i", [0]) * n
+    component = array("i", [-1]) * n
+    on_stack = bytearray(n)
+    stack = []
+    counter = 0
+    n_components = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        work = [(root, offsets[root])]
+        while work:
+            v, pos = work[-1]
+            end = offsets[v + 1]
+            while pos < end:
+                w = targets[pos]
+                pos += 1
+                if index[w] == -1:
+                    # Descend into w, v resumes at pos afterwards
+                    work[-1] = (v, pos)
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = 1
+                    work.append((w, offsets[w]))
+                    break
+                if on_stack[w] and index[w] < low[v]:
+                    low[v] = index[w]
+            else:
+                work.pop()
+                if low[v] == index[v]:
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        component[w] = n_components
+                        if w == v:
+                            break
+                    n_components += 1
+                if work:
+                    u = work[-1][0]
+                    if low[v] < low[u]:
+                        low[u] = low[v]
+    return component, n_components
+
+
+def component_sizes(component, n_components):
+    sizes = array("i", [0]) * n_components
+    for c in component:
+        sizes[c] += 1
+    return sizes
+
+
+def recursion_cycles(graph, scc=None):
+    """
+    The node ids of every component with more than one function, largest first.
+    """
+    component, n_components = scc or strongly_connected_components(graph)
+    members = {}
+    for node, c in enumerate(component):
+        members.setdefault(c, []).append(node)
+    cycles = [nodes for nodes in members.values() if len(nodes) > 1]
+    cycles.sort(key=len, reverse=True)
+    return cycles
+
+
+# ---------- Transitive fan-in / fan-out ----------
+
+def _condensed_edges(graph, component, reverse=False):
+    """
+    Distinct (from, to) component pairs of the calls between components
+    (callee -> caller with reverse=True).
+    """
+    pairs = set()
+    for s, t in graph.edges():
+        cs, ct = component[s], component[t]
+        if cs != ct:
+            pairs.add((ct, cs) if reverse else (cs, ct))
+    return pairs
+
+
+def _reach_counts(n_components, pairs, sizes, block=REACH_BLOCK_BITS):
+    """
+    Number of functions reachable from each component (its own included)
+    on a DAG whose edges (c, d) all have d < c, so components are done in
+    id order. Reachable sets are Python ints used as bitsets over the
+    component ids, one block of ids per pass: a set never exceeds block
+    bits, and it is dropped as soon as its last user is done.
+    """
+    successors = [[] for _ in range(n_components)]
+    users = array("i", [0]) * n_components
+    for c, d in pairs:
+        successors[c].append(d)
+        users[d] += 1
+
+    counts = array("q", [0]) * n_components
+    for lo in range(0, n_components, block):
+        hi = min(lo + block, n_components)
+        # Bits of components with several functions, counted by their size
+        multi = 0
+        for c in range(lo, hi):
+            if sizes[c] > 1:
+                multi |= 1 << (c - lo)
+        remaining = array("i", users)
+        reach = [0] * n_components
+        # Components below lo only reach ids below lo
+        for c in range(lo, n_components):
+            bits = 1 << (c - lo) if c < hi else 0
+            for d in successors[c]:
+                bits |= reach[d]
+                remaining[d] -= 1
+                if not remaining[d]:
+                    reach[d] = 0
+            if not bits:
+                continue
+            count = _popcount(bits)
+            extra = bits & multi
+            while extra:
+                low_bit = extra & -extra
+                count += sizes[lo + low_bit.bit_length() - 1] - 1
+                extra ^= low_bit
+            counts[c] += count
+            if remaining[c]:
+                reach[c] = bits
+    return counts
+
+
+def transitive_fan_out(graph, scc=None):
+    """
+    Per function, the number of other functions it reaches through any
+    chain of calls. Computed once per component on the condensation in
+    reverse topological order.
+    """
+    component, n_components = scc or strongly_connected_components(graph)
+    sizes = component_sizes(component, n_components)
+    counts = _reach_counts(n_components, _condensed_edges(graph, component), sizes)
+    return array("q", (counts[c] - 1 for c in component))
+
+
+def transitive_fan_in(graph, scc=None):
+    """
+    Per function, the number of other functions that reach it through
+    any chain of calls.
+    """
+    component, n_components = scc or strongly_connected_components(graph)
+    # Reversed calls go from higher to lower ids once the ids are flipped
+    last = n_components - 1
+    flipped = array("i", (last - c for c in component))
+    sizes = component_sizes(flipped, n_components)
+    counts = _reach_counts(n_components, _condensed_edges(graph, flipped, reverse=True), sizes)
+    return array("q", (counts[c] - 1 for c in flipped))
+
+
+# ---------- Depth and information flow ----------
+
+def entry_points(graph, names=None):
+    """
+    Node ids where call chains start: the functions with the given names
+    (e.g. main), or by default every function nobody calls.
+    """
+    if names:
+        names = set(names)
+        return [i for i, node in enumerate(graph.nodes) if node[1] in names]
+    return [i for i in range(len(graph)) if graph.fan_in(i) == 0]
+
+
+def unknown_entries(graph, names):
+    """
+    The given entry point names that match no function.
+    """
+    known = {node[1] for node in graph.nodes}
+    return [name for name in names if name not in known]
+
+
+def call_depth(graph, entries=None):
+    """
+    Per function, the smallest number of calls from an entry point
+    (breadth-first over the callees), -1 if no entry point reaches it.
+    """
+    if entries is None:
+        entries = entry_points(graph)
+    offsets, targets = graph.out_offsets, graph.out_targets
+    depth = array("i", [-1]) * len(graph)
+    queue = deque()
+    for node in entries:
+        if depth[node] == -1:
+            depth[node] = 0
+            queue.append(node)
+    while queue:
+        v = queue.popleft()
+        next_depth = depth[v] + 1
+        for w in targets[offsets[v]:offsets[v + 1]]:
+            if depth[w] == -1:
+                depth[w] = next_depth
+                queue.append(w)
+    return depth
+
+
+def function_lengths(summaries):
+    """
+    PLOC of every function in node order (the order of build_call_graph).
+    """
+    lengths = array("q")
+    for summary in summaries:
+        lengths.extend(summary["func_ploc"])
+    return lengths
+
+
+def henry_kafura(graph, lengths):
+    """
+    Henry-Kafura information flow complexity per function:
+    length * (fan_in * fan_out) ** 2, with length its PLOC.
+    """
+    return [length * (graph.fan_in(i) * graph.fan_out(i)) ** 2
+            for i, length in enumerate(lengths)]
+
+
+# ---------- Output ----------
+
+def graph_metrics(graph, summaries, entry_names=None):
+    """
+    All analytics at once, as {column: per-node sequence}.
+    """
+    scc = strongly_connected_components(graph)
+    component, n_components = scc
+    sizes = component_sizes(component, n_components)
+    entries = entry_points(graph, entry_names) if entry_names else None
+    return {
+        "transitive_fan_in": transitive_fan_in(graph, scc),
+        "transitive_fan_out": transitive_fan_out(graph, scc),
+        "scc": component,
+        "scc_size": [sizes[c] for c in component],
+        "depth": call_depth(graph, entries),
+        "henry_kafura": henry_kafura(graph, function_lengths(summaries)),
+    }
+
+
+def write_graph_metrics_csv(graph, metrics, output_file):
+    with open(output_file, mode="w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(GRAPH_METRICS_FIELDS)
+        columns = [metrics[field] for field in GRAPH_METRICS_FIELDS[3:]]
+        for i, node in enumerate(graph.nodes):
+            writer.writerow(list(node) + [column[i] for column in columns])
+
+
+def write_graphml(graph, output_file, attributes=None):
+    """
+    Export the graph as GraphML: nodes carry file, function and line
+    plus the given {name: per-node integer sequence} attributes.
+    """
+    attributes = attributes or {}
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                '  <key id="file" for="node" attr.name="file" attr.type="string"/>\n'
+                '  <key id="function" for="node" attr.name="function" attr.type="string"/>\n'
+                '  <key id="line" for="node" attr.name="line" attr.type="int"/>\n')
+        for name in attributes:
+            f.write(f'  <key id={quoteattr(name)} for="node" attr.name={quoteattr(name)} attr.type="long"/>\n')
+        f.write('  <graph id="calls" edgedefault="directed">\n')
+        for i, (file_path, name, line) in enumerate(graph.nodes):
+            data = "".join(f'<data key={quoteattr(key)}>{values[i]}</data>' for key, values in attributes.items())
+            f.write(f'    <node id="n{i}"><data key="file">{escape(file_path)}</data>'
+                    f'<data key="function">{escape(name)}</data><data key="line">{line}</data>{data}</node>\n')
+        for s, t in graph.edges():
+            f.write(f'    <edge source="n{s}" target="n{t}"/>\n')
+        f.write('  </graph>\n</graphml>\n')
+
+
+def _dot_string(text):
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def write_dot(graph, output_file, attributes=None):
+    """
+    Export the graph in Graphviz DOT, labelled function\\nfile:line,
+    with the given attributes as extra node attributes.
+    """
+    attributes = attributes or {}
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("digraph calls {\n  node [shape=box];\n")
+        for i, (file_path, name, line) in enumerate(graph.nodes):
+            extra = "".join(f", {key}={values[i]}" for key, values in attributes.items())
+            label = _dot_string(f"{name}\n{file_path}:{line}").replace("\n", "\\n")
+            f.write(f"  n{i} [label={label}{extra}];\n")
+        for s, t in graph.edges():
+            f.write(f"  n{s} -> n{t};\n")
+        f.write("}\n")
+
+
+def write_graph(graph, output_file, attributes=None):
+    """
+    GraphML or DOT (.dot / .gv), chosen by the file extension.
+    """
+    if output_file.endswith((".dot", ".gv")):
+        write_dot(graph, output_file, attributes)
+    else:
+        write_graphml(graph, output_file, attributes)
@@ -0,0 +1,182 @@
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+_NULL_CONTEXT = nullcontext()
+
+
+class NullProfiler:
+    """
+    Profiler used when instrumentation is disabled: every hook is a no-op.
+    """
+    enabled = False
+
+    def stage(self, name, lang=None):
+        return _NULL_CONTEXT
+
+    def file_done(self, file_path, lang, nbytes, seconds):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Profiler:
+    """
+    Records wall and CPU time per stage and per language, bytes read,
+    the slowest files and (optionally) Chrome trace events.
+    Worker processes use their own Profiler and send a snapshot() back,
+    which the parent merge()s.
+    """
+    enabled = True
+
+    def __init__(self, slowest=10, trace=False):
+        self.timings = {}     # (stage, lang) -> [wall, cpu, calls]
+        self.bytes_read = 0
+        self.files = 0
+        self.slowest_n = slowest
+        self.slowest = []     # min-heap of (seconds, file)
+        self.trace = trace
+        self.events = []
+
+    @contextmanager
+    def stage(self, name, lang=None):
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall0
+            cpu = time.process_time() - cpu0
+            entry = self.timings.get((name, lang))
+            if entry is None:
+                self.timings[(name, lang)] = [wall, cpu, 1]
+            else:
+                entry[0] += wall
+                entry[1] += cpu
+                entry[2] += 1
+            if self.trace:
+                self.events.append({
+                    "name": name, "cat": lang or "tool", "ph": "X",
+                    "ts": wall0 * 1e6, "dur": wall * 1e6,
+                    "pid": os.getpid(), "tid": threading.get_ident(),
+                })
+
+    def file_done(self, file_path, lang, nbytes, seconds):
+        self.files += 1
+        self.bytes_read += nbytes
+        self._keep_slowest(seconds, file_path)
+
+    def _keep_slowest(self, seconds, file_path):
+        if len(self.slowest) < self.slowest_n:
+            heapq.heappush(self.slowest, (seconds, file_path))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, file_path))
+
+    def snapshot(self):
+        return {
+            "timings": [(k[0], k[1], v) for k, v in self.timings.items()],
+            "bytes_read": self.bytes_read,
+            "files": self.files,
+            "slowest": self.slowest,
+            "events": self.events,
+        }
+
+    def merge(self, snapshot):
+        for name, lang, (wall, cpu, calls) in snapshot["timings"]:
+            entry = self.timings.setdefault((name, lang), [0.0, 0.0, 0])
+            entry[0] += wall
+            entry[1] += cpu
+            entry[2] += calls
+        self.bytes_read += snapshot["bytes_read"]
+        self.files += snapshot["files"]
+        for seconds, file_path in snapshot["slowest"]:
+            self._keep_slowest(seconds, file_path)
+        self.events.extend(snapshot["events"])
+
+    def report(self, stream=sys.stderr):
+        per_stage = {}
+        per_lang = {}
+        for (name, lang), (wall, cpu, calls) in self.timings.items():
+            s = per_stage.setdefault(name, [0.0, 0.0, 0])
+            s[0] += wall
+            s[1] += cpu
+            s[2] += calls
+            if lang is not None:
+                l = per_lang.setdefault(lang, {})
+                l[name] = l.get(name, 0.0) + wall
+
+        print("Profile", file=stream)
+        print("────────────────────────────", file=stream)
+        print(f"{'stage':16} {'wall s':>9} {'cpu s':>9} {'calls':>9}", file=stream)
+        for name, (wall, cpu, calls) in sorted(per_stage.items(), key=lambda kv: -kv[1][0]):
+            print(f"{name:16} {wall:9.3f} {cpu:9.3f} {calls:9d}", file=stream)
+        print(file=stream)
+        for lang, stages in sorted(per_lang.items()):
+            parts = ", ".join(f"{k} {v:.3f}s" for k, v in sorted(stages.items(), key=lambda kv: -kv[1]))
+            print(f"{lang:8} {parts}", file=stream)
+        print(file=stream)
+        print(f"Files read: {self.files:,}, bytes read: {self.bytes_read:,}", file=stream)
+        if self.slowest:
+            print(f"Slowest {len(self.slowest)} files:", file=stream)
+            for seconds, file_path in sorted(self.slowest, reverse=True):
+                print(f"  {seconds:8.3f} s  {file_path}", file=stream)
+
+    def write_trace(self, output_file):
+        """
+        Chrome trace (chrome://tracing, Perfetto) of all recorded stages.
+        """
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+class Progress:
+    """
+    Live "done/discovered, rate, ETA" line on stderr.
+    """
+
+    def __init__(self, stream=sys.stderr, interval=0.5):
+        self.stream = stream
+        self.interval = interval
+        self.discovered = 0
+        self.scan_done = False
+        self.done = 0
+        self.start = time.perf_counter()
+        self.last = 0.0
+
+    def track(self, iterable):
+        """
+        Count files while the scanner yields them.
+        """
+        for item in iterable:
+            self.discovered += 1
+            yield item
+        self.scan_done = True
+
+    def advance(self, n=1):
+        self.done += n
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self._render(now)
+
+    def finish(self):
+        self._render(time.perf_counter())
+        self.stream.write("\n")
+        self.stream.flush()
+
+    def _render(self, now):
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        total = max(self.discovered, self.done)
+        remaining = total - self.done
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "?"
+        if not self.scan_done:
+            eta = ">" + eta
+        self.stream.write(f"\r{self.done:,}/{total:,}{'' if self.scan_done else '+'} files"
+                          f"  {rate:,.0f} files/s  ETA {eta}   ")
+        self.stream.flush()
@@ -0,0 +1,56 @@
+import os
+from collections import deque
+
+from loc_counter import MMAP_THRESHOLD
+
+DEFAULT_QUEUE_DEPTH = 64
+
+
+def read_whole(file_path):
+    """
+    Content of a file for the analysis, or None if the worker should open
+    it itself: big files (mapped there, never held in memory) and files
+    that cannot be read (the worker raises the usual error).
+    """
+    try:
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+                return None
+            return f.read()
+    except OSError:
+        return None
+
+
+def prefetch(source_files, readers=4, depth=DEFAULT_QUEUE_DEPTH):
+    """
+    Yield (file_path, content) in the order of source_files while reader
+    threads load up to depth files ahead. Reads release the GIL, so slow
+    storage (NFS, cold page cache) overlaps with the consumer's analysis,
+    and at most depth contents are held at once.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=readers) as executor:
+        for file_path in source_files:
+            pending.append((file_path, executor.submit(read_whole, file_path)))
+            if len(pending) >= depth:
+                file_path, future = pending.popleft()
+                yield file_path, future.result()
+        while pending:
+            file_path, future = pending.popleft()
+            yield file_path, future.result()
+
+
+def bounded_map(executor, fn, items, depth=DEFAULT_QUEUE_DEPTH):
+    """
+    executor.map(fn, *zip(*items)) in order, with at most depth calls in
+    flight. Unlike Executor.map, items are only drawn as results are
+    consumed, so a lazy producer (prefetch) is throttled by the workers.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, *item))
+        if len(pending) >= depth:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -1,3 +1,15 @@
+# File extension -> language, shared by the scanner and the analyzers
+EXTENSIONS = {
+    ".py": "python",
+    ".c": "c",
+    ".h": "c",
+    ".cpp": "cpp",
+    ".hpp": "cpp",
+    ".java": "java",
+    ".go": "go",
+    ".rs": "rust",
+}
+
 LANGUAGE_RULES = {
     "python": {
         "single_line_comment": "#",
@@ -0,0 +1,111 @@
+import re
+from array import array
+
+from language_rules import LANGUAGE_RULES
+
+# String and character literals per language (comments come from LANGUAGE_RULES)
+STRING_LITERALS = {
+    "python": [
+        r'[rRbBuUfF]{0,2}"""(?:\\.|[^\\])*?(?:"""|\Z)',
+        r"[rRbBuUfF]{0,2}'''(?:\\.|[^\\])*?(?:'''|\Z)",
+        r'[rRbBuUfF]{0,2}"(?:\\.|[^"\\\n])*"',
+        r"[rRbBuUfF]{0,2}'(?:\\.|[^'\\\n])*'",
+    ],
+    "c": [r'"(?:\\.|[^"\\\n])*"', r"'(?:\\.|[^'\\\n])*'"],
+    "cpp": [r'"(?:\\.|[^"\\\n])*"', r"'(?:\\.|[^'\\\n])*'"],
+    "java": [r'"""(?:\\.|[^\\])*?(?:"""|\Z)', r'"(?:\\.|[^"\\\n])*"', r"'(?:\\.|[^'\\\n])*'"],
+    "go": [r'"(?:\\.|[^"\\\n])*"', r"'(?:\\.|[^'\\\n])*'", r"`[^`]*`"],
+    # A quote not closed right after one (escaped) character is a lifetime, not a char
+    "rust": [r'"(?:\\.|[^"\\])*"', r"'(?:\\.[^'\n]*|[^'\\\n])'"],
+}
+
+# Multi-character operators, longest first
+OPERATORS = [
+    "<<=", ">>=", "...", "**=", "//=",
+    "->", "::", "&&", "||", "++", "--", "<<", ">>", "**", "//",
+    "==", "!=", "<=", ">=", "+=", "-=", "*=", "/=", "%=", "&=", "|=", "^=", ":=",
+]
+
+_LEXERS = {}
+
+
+def _lexer(lang):
+    """
+    Master regex of one language, compiled on first use for str and bytes.
+    Group 1 is a comment, string literal or preprocessor line (dropped),
+    group 2 a newline with the indentation that follows, or a token.
+    """
+    lexer = _LEXERS.get(lang)
+    if lexer is not None:
+        return lexer
+    rule = LANGUAGE_RULES[lang]
+    junk = []
+    if rule.get("single_line_comment"):
+        junk.append(re.escape(rule["single_line_comment"]) + r"[^\n]*")
+    # Python's multi-line "comments" are triple-quoted strings, covered below
+    if lang != "python" and rule.get("multi_line_start"):
+        junk.append(re.escape(rule["multi_line_start"]) + r".*?(?:" + re.escape(rule["multi_line_end"]) + r"|\Z)")
+    junk.extend(STRING_LITERALS.get(lang, []))
+    if rule.get("preprocessor"):
+        # Up to the end of line, backslash continuations included
+        junk.append(re.escape(rule["preprocessor"]) + r"(?:\\\n|[^\n])*")
+    tokens = [r"\n[ \t]*", r"[A-Za-z_]\w*", r"\d[\w.]*"]
+    tokens.extend(re.escape(op) for op in OPERATORS)
+    tokens.append(r"[^\s]")
+    pattern = r"[ \t\r\f\v]*(?:(" + "|".join(junk) + r")|(" + "|".join(tokens) + r"))"
+    lexer = _LEXERS[lang] = {
+        str: re.compile(pattern, re.DOTALL),
+        bytes: re.compile(pattern.encode(), re.DOTALL),
+    }
+    return lexer
+
+
+def tokenize(code, lang):
+    """
+    One pass over the source. Returns (tokens, lines, indents): the code
+    tokens (identifiers, keywords, numbers, operators, punctuation) with
+    comments, string literals and preprocessor lines removed, the line of
+    every token, and {line: indentation} for lines starting with a token.
+    code may be raw bytes or an mmap of UTF-8 source (tokens are decoded).
+    """
+    is_text = isinstance(code, str)
+    lexer = _lexer(lang)[str if is_text else bytes]
+    if is_text:
+        matches = lexer.findall(code)
+        newline = "\n"
+    else:
+        # Lazily on big (mapped) files, repeated tokens decoded once
+        matches = (m.groups() for m in lexer.finditer(code))
+        newline = b"\n"
+        decoded = {}
+
+    tokens = []
+    lines = array("i")
+    indents = {}
+    line = 1
+    head = code[:256]
+    indent = len(head) - len(head.lstrip(" \t" if is_text else b" \t"))
+    last_line = 0
+    for junk, tok in matches:
+        if junk:
+            n = junk.count(newline)
+            if n:
+                line += n
+                indent = None
+            continue
+        if tok[:1] == newline:
+            line += 1
+            indent = len(tok) - 1
+            continue
+        if not is_text:
+            text = decoded.get(tok)
+            if text is None:
+                text = decoded[tok] = tok.decode("utf-8", errors="ignore")
+            tok = text
+        if line != last_line:
+            last_line = line
+            if indent is not None:
+                indents[line] = indent
+        tokens.append(tok)
+        lines.append(line)
+    return tokens, lines, indents
@@ -1,67 +1,478 @@
+import hashlib
+import mmap
 import os
 import re
-from language_rules import LANGUAGE_RULES
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from call_graph import CallGraph
+from instrumentation import NULL_PROFILER
+from language_rules import EXTENSIONS, LANGUAGE_RULES
+from lexer import tokenize
+from python_ast import analyze_python_tree, parse_python
+
+# Bump whenever a change alters the produced metrics (invalidates caches)
+ANALYZER_VERSION = "4"
+
+# Files from this size on are memory-mapped and scanned as bytes
+MMAP_THRESHOLD = 1 << 20
+
+# "heuristic": line-based regex scans, "lexer": one token stream per file,
+# "ast": Python parsed with the ast module, the lexer for everything else
+BACKENDS = ["heuristic", "lexer", "ast"]
 
 CONTROL_KEYWORDS = [
     "if", "elif", "else if", "for", "while", "case", "catch", "except",
     "&&", "||", "?", "switch", "do"
 ]
 
+KEYWORDS_TO_IGNORE = {
+    "if", "for", "while", "switch", "return", "sizeof",
+    "catch", "try", "else", "elif", "do"
+}
+
 def analyze_file(file_path):
+    summary = analyze_source(file_path)
+    if summary is None:
+        return [], []
+    return summary_rows(summary), list(summary["functions"])
+
+
+def analyze_source(file_path, profiler=NULL_PROFILER, backend="heuristic", data=None):
+    """
+    Single pass over one source file.
+    Reads and decodes the file once and returns a compact summary
+    (PLOC, LLOC, per-function CC, definitions and call sets),
+    or None if the language is not supported.
+    data: the file content if it was already read (see io_pipeline).
+    """
     lang = detect_language(file_path)
     if lang not in LANGUAGE_RULES:
-        return [], []
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-        code = f.read()
+        return None
+    start = time.perf_counter()
+    if data is not None:
+        with profiler.stage("decode", lang):
+            code = decode_source(data)
+        summary = analyze_code(file_path, code, lang, profiler, backend, raw=data)
+        summary["digest"] = content_digest(data)
+        profiler.file_done(file_path, lang, len(data), time.perf_counter() - start)
+        return summary
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        mm = None
+        if size and size >= MMAP_THRESHOLD:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if BARE_CR.search(mm):
+                # Old Mac line ends only split lines once decoded
+                mm.close()
+                mm = None
+        if mm is not None:
+            # Big files: regexes run on the mapping, lines are decoded lazily
+            with mm:
+                summary = analyze_code(file_path, mm, lang, profiler, backend, raw=mm)
+                summary["digest"] = content_digest(mm)
+        else:
+            with profiler.stage("read", lang):
+                data = f.read()
+            with profiler.stage("decode", lang):
+                code = decode_source(data)
+            summary = analyze_code(file_path, code, lang, profiler, backend, raw=data)
+            summary["digest"] = content_digest(data)
+    profiler.file_done(file_path, lang, size, time.perf_counter() - start)
+    return summary
+
+
+# A carriage return not followed by "\n": a line end only after decoding
+BARE_CR = re.compile(rb"\r(?!\n)")
+LINE_BREAK = re.compile(rb"\r\n?|\n")
+
+
+def decode_source(data):
+    """
+    Decode raw file content the same way as open(..., "r", errors="ignore"),
+    including universal newline translation.
+    """
+    code = data.decode("utf-8", errors="ignore")
+    if "\r" in code:
+        code = code.replace("\r\n", "\n").replace("\r", "\n")
+    return code
 
-    ploc = count_physical_loc(code)
-    lloc = count_logical_loc(code, lang)
-    cc_results = count_cyclomatic_complexity(code, lang)
 
-    # --- Extract function definitions (language-aware) ---
-    if lang == "python":
-        funcs = re.findall(r"def\s+([A-Za-z_]\w*)\s*\([^)]*\)\s*:", code)
+def content_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def iter_text_lines(code):
+    """
+    Lines of the source like code.splitlines(). Raw bytes (e.g. an mmap)
+    are decoded one line at a time, which gives the same lines as decoding
+    the whole file first.
+    """
+    if isinstance(code, str):
+        return code.splitlines()
+    return _iter_decoded_lines(code)
+
+
+def _iter_decoded_lines(buf):
+    for _, line in _iter_numbered_decoded_lines(buf):
+        yield line
+
+
+def _iter_numbered_decoded_lines(buf):
+    pos = 0
+    end = len(buf)
+    number = 0
+    while pos < end:
+        nl = buf.find(b"\n", pos)
+        nl = end if nl == -1 else nl + 1
+        number += 1
+        for line in buf[pos:nl].decode("utf-8", errors="ignore").splitlines():
+            yield number, line
+        pos = nl
+
+
+# Line boundaries of str.splitlines() other than "\n"
+OTHER_LINE_BREAKS = re.compile("[\r\x0b\x0c\x1c-\x1e\x85\u2028\u2029]")
+
+
+def iter_numbered_lines(code):
+    """
+    (line number, line) pairs of iter_text_lines, numbered by "\n" lines so
+    the numbers agree with function lines and offsets. Parts of a line split
+    by another boundary (form feed, ...) share its number.
+    """
+    if not isinstance(code, str):
+        return _iter_numbered_decoded_lines(code)
+    if not OTHER_LINE_BREAKS.search(code):
+        return enumerate(code.splitlines(), 1)
+    return ((number, part) for number, line in enumerate(code.split("\n"), 1)
+            for part in line.splitlines())
+
+
+def analyze_code(file_path, code, lang, profiler=NULL_PROFILER, backend="heuristic", raw=None):
+    """
+    Build the per-file summary from already decoded source code
+    (or raw bytes / an mmap of UTF-8 source).
+    Per-function data is stored as parallel lists in definition order.
+    Function offsets are byte offsets into raw (the undecoded file content),
+    or offsets into code when raw is not given.
+    """
+    with profiler.stage("ploc", lang):
+        ploc = count_physical_loc(code)
+    summary = logical_lines = None
+    if backend == "ast" and lang == "python":
+        summary, logical_lines = analyze_python_ast(file_path, code, ploc, profiler)
+    if summary is None and backend in ("lexer", "ast"):
+        summary, logical_lines = analyze_tokens(file_path, code, lang, ploc, profiler)
+    if summary is None:
+        with profiler.stage("lloc", lang):
+            logical_lines = count_logical_lines(code, lang)
+        with profiler.stage("cc", lang):
+            cc_results = count_cyclomatic_complexity(code, lang)
+        with profiler.stage("functions", lang):
+            funcs, lines, end_lines, local, calls = extract_functions(code, lang, is_header(file_path))
+        summary = {
+            "file": file_path,
+            "language": lang,
+            "ploc": ploc,
+            "lloc": len(logical_lines),
+            "functions": funcs,
+            "lines": lines,
+            "end_lines": end_lines,
+            "cyclomatic": [cc_results.get(func, 1) for func in funcs],
+            "local": local,
+            "calls": calls,
+        }
+    with profiler.stage("spans", lang):
+        add_function_spans(summary, code if raw is None else raw, logical_lines)
+    return summary
+
+
+def add_function_spans(summary, raw, logical_lines):
+    """
+    Complete the line span (lines .. end_lines) of every function with its
+    offsets in raw ([start_offsets, end_offsets), whole lines) and its own
+    PLOC and LLOC, the latter from the file's logical lines (ascending).
+    """
+    starts, ends = summary["lines"], summary["end_lines"]
+    offsets = line_offsets(raw, set(starts) | {end + 1 for end in ends})
+    start_offsets = [offsets[line] for line in starts]
+    end_offsets = [offsets[end + 1] for end in ends]
+    func_ploc = [count_physical_loc(raw[a:b]) for a, b in zip(start_offsets, end_offsets)]
+    func_lloc = [bisect_right(logical_lines, end) - bisect_left(logical_lines, start)
+                 for start, end in zip(starts, ends)]
+    summary["start_offsets"] = start_offsets
+    summary["end_offsets"] = end_offsets
+    summary["func_ploc"] = func_ploc
+    summary["func_lloc"] = func_lloc
+
+
+def line_offsets(code, line_numbers):
+    """
+    {line: offset of its first character} for the wanted lines (1-based,
+    numbered like the decoded source: "\n", "\r\n" or a bare "\r" ends a
+    line), len(code) for lines past the end. One forward scan.
+    """
+    if isinstance(code, str):
+        starts = _line_starts(code, "\n")
+    elif BARE_CR.search(code):
+        starts = (m.end() for m in LINE_BREAK.finditer(code))
     else:
-        funcs = re.findall(r"\b([A-Za-z_]\w*)\s*\([^)]*\)\s*\{", code)
+        starts = _line_starts(code, b"\n")
+    offsets = {}
+    line, pos, end = 1, 0, len(code)
+    for target in sorted(line_numbers):
+        while line < target and pos < end:
+            pos = next(starts, end)
+            line += 1
+        offsets[target] = pos if line == target else end
+    return offsets
 
-    keywords_to_ignore = {
-        "if", "for", "while", "switch", "return", "sizeof",
-        "catch", "try", "else", "elif", "do"
-    }
-    funcs = [f for f in funcs if f not in keywords_to_ignore]
 
+def _line_starts(code, newline):
+    nl = code.find(newline)
+    while nl != -1:
+        yield nl + 1
+        nl = code.find(newline, nl + 1)
+
+
+def summary_rows(summary):
+    """
+    Expand a per-file summary into one output row per function.
+    """
     rows = []
-    for func in funcs:
+    for i, (func, cc) in enumerate(zip(summary["functions"], summary["cyclomatic"])):
         rows.append({
-            "file": file_path,
-            "language": lang,
+            "file": summary["file"],
+            "language": summary["language"],
             "function": func,
             "signature": func + "()",
-            "ploc_file": ploc,
-            "lloc_file": lloc,
-            "cyclomatic": cc_results.get(func, 1)
+            "ploc_file": summary["ploc"],
+            "lloc_file": summary["lloc"],
+            "cyclomatic": cc,
+            "line_start": summary["lines"][i],
+            "line_end": summary["end_lines"][i],
+            "offset_start": summary["start_offsets"][i],
+            "offset_end": summary["end_offsets"][i],
+            "ploc_function": summary["func_ploc"][i],
+            "lloc_function": summary["func_lloc"][i],
         })
+    return rows
+
+
+# ---------- Language registry ----------
+# Pattern sources are compiled per language on first use (see language_patterns),
+# so importing this module or analyzing a single file compiles only what is needed
+
+# Function definitions, indexed by is_python
+FUNC_DEF = {
+    True: r"def\s+([A-Za-z_]\w*)\s*\([^)]*\)\s*:",
+    False: r"\b([A-Za-z_]\w*)\s*\([^)]*\)\s*\{",
+}
+PY_NEXT_DEF = r"^def\s+[A-Za-z_]\w*\s*\("
+# Indentation of a line holding code (not blank, not only a comment)
+PY_CODE_LINE = r"^([ \t]*)[^\s#]"
+CALL_PATTERN = r"\b([A-Za-z_]\w*)\s*\("
+
+# Modifiers that make a definition invisible outside its file
+LOCAL_MODIFIERS = {
+    "c": "static",
+    "cpp": "static",
+    "java": "private",
+}
+
+# Comments, string/char literals and braces, in one left-to-right scan
+BRACE_SCANNER = (
+    r'//[^\n]*'
+    r'|/\*.*?(?:\*/|\Z)'
+    r'|"(?:\\.|[^"\\\n])*"'
+    r"|'(?:\\.|[^'\\\n])*'"
+    r'|`[^`]*`'
+    r'|([{}])'
+)
+
+# Keywords that make a line a logical statement on their own
+LOGICAL_STATEMENTS = [
+    "for", "if", "elif", "while", "switch", "case", "else", "do", "void", "return",
+    "def", "class", "import", "from", "try", "continue", "break", "package"
+]
+
+# Per-language scanners for count_cyclomatic_complexity, indexed by is_python
+CC_FUNC_DEF = {
+    True: r"^def\s+([A-Za-z_]\w*)\s*\([^)]*\)\s*:",
+    # Signature, body may start here or on a following line with '{'
+    False: r"\b([A-Za-z_]\w*)\s*\([^)]*\)\s*(\{)?\s*$",
+}
+CC_DECISIONS = {
+    # Python: 'elif' and 'if' are distinct statements, else not taken into account
+    True: r"\b(?:elif|if|for|while|except)\b",
+    False: r"\belse\s+if\b|\b(?:if|for|while|case|catch)\b|&&|\|\||\?",
+}
+
+_PATTERNS = {}
+
+def language_patterns(lang):
+    """
+    Compiled regexes of one language, built once on first use and shared
+    by all analyzers. Patterns used on raw source exist for str and bytes.
+    """
+    patterns = _PATTERNS.get(lang)
+    if patterns is None:
+        is_python = lang == "python"
+        local = LOCAL_MODIFIERS.get(lang)
+        patterns = _PATTERNS[lang] = {
+            "lloc_keywords": re.compile(r"\b(?:" + "|".join(LOGICAL_STATEMENTS) + r")\b"),
+            "cc_func_def": re.compile(CC_FUNC_DEF[is_python]),
+            "cc_decisions": re.compile(CC_DECISIONS[is_python]),
+            "func_def": _compile_both(FUNC_DEF[is_python]),
+            "next_def": _compile_both(PY_NEXT_DEF, re.MULTILINE) if is_python else None,
+            "code_line": _compile_both(PY_CODE_LINE, re.MULTILINE) if is_python else None,
+            "calls": _compile_both(CALL_PATTERN),
+            "local_modifier": _compile_both(rf"\b{local}\b") if local else None,
+            "braces": None if is_python else _compile_both(BRACE_SCANNER, re.DOTALL),
+        }
+    return patterns
+
+
+def _compile_both(pattern, flags=0):
+    """
+    The same pattern for decoded text (str) and raw source (bytes, mmap).
+    """
+    return {str: re.compile(pattern, flags), bytes: re.compile(pattern.encode(), flags)}
+
+
+HEADER_EXTENSIONS = {".h", ".hpp"}
+
+def is_header(file_path):
+    return os.path.splitext(file_path)[1] in HEADER_EXTENSIONS
+
+
+def extract_functions(code, lang, header=False):
+    """
+    One scan over the definitions of a file. For every function returns
+    its name, first and last line, whether it is file-local (static/private,
+    never in a header) and the sorted names called in its body.
+    code may be raw bytes or an mmap: bodies are then scanned in place
+    and only identifiers are decoded.
+    """
+    is_python = lang == "python"
+    is_text = isinstance(code, str)
+    kind = str if is_text else bytes
+    newline, delimiters = ("\n", ";{}") if is_text else (b"\n", (b";", b"{", b"}"))
+    patterns = language_patterns(lang)
+    local_modifier = None if header or patterns["local_modifier"] is None else patterns["local_modifier"][kind]
+    next_def = patterns["next_def"][kind] if is_python else None
+    code_line = patterns["code_line"][kind] if is_python else None
+    find_calls = patterns["calls"][kind].findall
+    brace_index = None if is_python else build_brace_index(code, lang)
+
+    funcs, lines, end_lines, local, calls = [], [], [], [], []
+    line_no = 1
+    last = 0
+    for match in patterns["func_def"][kind].finditer(code):
+        name = match.group(1)
+        if not is_text:
+            name = name.decode("ascii")
+        if name in KEYWORDS_TO_IGNORE:
+            continue
+        start = match.start()
+        if is_text:
+            line_no += code.count(newline, last, start)
+        else:
+            line_no += code[last:start].count(newline)
+        last = start
+
+        # Extract the function body extent
+        start_idx = match.end()
+        if is_python:
+            following = next_def.search(code, start_idx)
+            end_idx = following.start() if following else len(code)
+            # Last line: the last code line indented deeper than the def,
+            # before the first one that is not
+            line_start = code.rfind(newline, 0, start) + 1
+            indent = len(code[line_start:start]) - len(code[line_start:start].lstrip())
+            body_last = start_idx - 1
+            for line in code_line.finditer(code, start_idx):
+                if len(line.group(1)) <= indent:
+                    break
+                body_last = line.start()
+            line_end = code.find(newline, body_last)
+            last_char = (len(code) if line_end == -1 else line_end) - 1
+        else:
+            # The opening brace is the last character of the match
+            close_idx = brace_index.get(start_idx - 1)
+            end_idx = close_idx + 1 if close_idx is not None else start_idx
+            last_char = min(end_idx, len(code)) - 1
+        if is_text:
+            end_line = line_no + code.count(newline, start, last_char)
+        else:
+            end_line = line_no + code[start:last_char].count(newline)
+
+        # Modifiers of this declaration: text since the previous ';', '{' or '}'
+        is_local = False
+        if local_modifier is not None:
+            window = code[max(0, start - 200):start]
+            cut = max(window.rfind(d) for d in delimiters)
+            is_local = local_modifier.search(window, cut + 1) is not None
+
+        # Extract all possible calls in one pass
+        calls_found = set(find_calls(code, start_idx, end_idx))
+        if not is_text:
+            calls_found = {c.decode("ascii") for c in calls_found}
 
-    return rows, funcs
+        funcs.append(name)
+        lines.append(line_no)
+        end_lines.append(end_line)
+        local.append(is_local)
+        calls.append(tuple(sorted(calls_found - KEYWORDS_TO_IGNORE)))
+
+    return funcs, lines, end_lines, local, calls
+
+
+def build_brace_index(code, lang="c"):
+    """
+    Map the offset of every '{' to the offset of its matching '}'
+    (len(code) if it is never closed). Braces inside comments and
+    string literals are skipped, so they are not in the index.
+    """
+    is_text = isinstance(code, str)
+    open_brace = "{" if is_text else b"{"
+    index = {}
+    stack = []
+    for m in language_patterns(lang)["braces"][str if is_text else bytes].finditer(code):
+        if not m.lastindex:
+            continue  # comment or literal
+        if m.group(1) == open_brace:
+            stack.append(m.start())
+        elif stack:
+            index[stack.pop()] = m.start()
+    for open_idx in stack:
+        index[open_idx] = len(code)
+    return index
 
 
 def detect_language(file_path):
-   ext = os.path.splitext(file_path)[1]
-   for extension, lang in {
-       ".py": "python",
-       ".c": "c",
-       ".h": "c",
-       ".cpp": "cpp",
-       ".hpp": "cpp",
-       ".java": "java",
-       ".go": "go",
-       ".rs": "rust",
-   }.items():
-       if ext == extension:
-           return lang
-   return "unknown"
+   return EXTENSIONS.get(os.path.splitext(file_path)[1], "unknown")
+
+# A non-blank line of raw source, matched in place (no per-line copies)
+NON_BLANK_LINE = re.compile(rb"[^\n\r\x0b\x0c\x1c-\x1e]*?[^\s\x1c-\x1f][^\n\r\x0b\x0c\x1c-\x1e]*")
+# Lines with non-ASCII bytes may hold Unicode blanks (NBSP) or breaks (U+2028)
+NON_ASCII_BYTE = re.compile(rb"[\x80-\xff]")
 
 def count_physical_loc(code):
+   if not isinstance(code, str):
+       count = sum(1 for _ in NON_BLANK_LINE.finditer(code))
+       # Recount those "\n" lines decoded, as the str path sees them
+       match = NON_ASCII_BYTE.search(code)
+       while match is not None:
+           start = code.rfind(b"\n", 0, match.start()) + 1
+           end = code.find(b"\n", match.start())
+           end = len(code) if end == -1 else end
+           line = code[start:end]
+           count -= sum(1 for _ in NON_BLANK_LINE.finditer(line))
+           count += count_physical_loc(line.decode("utf-8", errors="ignore"))
+           match = NON_ASCII_BYTE.search(code, end)
+       return count
    lines = code.splitlines()
    return sum(1 for line in lines if line.strip())
 
@@ -69,24 +480,28 @@ def count_logical_loc(code, lang):
     """
     Logical LOC counter
     """
+    return len(count_logical_lines(code, lang))
+
+def count_logical_lines(code, lang):
+    """
+    Numbers ("\n" lines, ascending) of the lines counted as logical LOC,
+    once per counted line part.
+    """
+    counted = array("i")
     if lang not in LANGUAGE_RULES:
-        return 0
+        return counted
 
     rule = LANGUAGE_RULES[lang]
-    count = 0
     inside_multiline = False
     ml_start = rule.get("multi_line_start")
     ml_end   = rule.get("multi_line_end")
     ml_start_alt = rule.get("multi_line_start_alt")
     ml_end_alt   = rule.get("multi_line_end_alt")
     preproc = rule.get("preprocessor")
+    # All keywords in one precompiled alternation
+    find_keyword = language_patterns(lang)["lloc_keywords"].search
 
-    logical_statements = [
-        "for","if","elif","while","switch","case","else","do","void","return",
-        "def","class","import","from","try","continue","break","package"
-    ]
-
-    for raw_line in code.splitlines():
+    for number, raw_line in iter_numbered_lines(code):
         line = raw_line.strip()
         if not line:
             continue
@@ -119,21 +534,19 @@ def count_logical_loc(code, lang):
 
         # Logical statements handling
         if "(" in line and ")" in line:
-            count += 1
+            counted.append(number)
             continue
         if "=" in line:
-            count += 1
+            counted.append(number)
             continue
         if rule.get("statement_end") and rule["statement_end"] in line:
-            count += 1
+            counted.append(number)
             continue
 
-        for kw in logical_statements:
-            if re.search(rf"\b{kw}\b", line):
-                count += 1
-                break
+        if find_keyword(line):
+            counted.append(number)
 
-    return count
+    return counted
 
 def count_cyclomatic_complexity(code, lang):
     """
@@ -152,28 +565,28 @@ def count_cyclomatic_complexity(code, lang):
     brace_depth = 0
     entered_body = False  # becomes True after we've seen the first '{' of the body
 
-    lines = code.splitlines()
-    for raw in lines:
+    if lang not in LANGUAGE_RULES:
+        return {}
+    comment = LANGUAGE_RULES[lang]["single_line_comment"]
+    is_python = lang == "python"
+    patterns = language_patterns(lang)
+    func_def_search = patterns["cc_func_def"].search
+    count_decisions = patterns["cc_decisions"].findall
+
+    for raw in iter_text_lines(code):
         original = raw  # keep indentation
         line = raw.strip()
 
-        if lang not in LANGUAGE_RULES:
-            return {}
-
         # Skip blanks and single-line comments
-        if not line or line.startswith(LANGUAGE_RULES[lang]["single_line_comment"]):
+        if not line or line.startswith(comment):
             continue
 
-        # Detect function definition (language-aware) 
-        if lang == "python":
-            func_def = re.search(r"^def\s+([A-Za-z_]\w*)\s*\([^)]*\)\s*:", original)
-        else:
-            # Detect signature, body may start here or on a following line with '{'
-            func_def = re.search(r"\b([A-Za-z_]\w*)\s*\([^)]*\)\s*(\{)?\s*$", line)
+        # Detect function definition (language-aware), a signature needs a ')'
+        func_def = func_def_search(original if is_python else line) if ")" in line else None
 
         # ---------- Handle new function definition ----------
         if func_def:
-            if lang == "python":
+            if is_python:
                 new_name = func_def.group(1)
                 new_indent = len(original) - len(original.lstrip())
 
@@ -222,16 +635,9 @@ def count_cyclomatic_complexity(code, lang):
 
         # Count decision points while inside function
         if inside_function:
-            if lang == "python":
-                # Count decisions 
-                tmp = line
-
-                # Python: 'elif' and 'if' are distinct statement, else not taken into account
-                cc += len(re.findall(r'\belif\b', tmp))
-                cc += len(re.findall(r'\bif\b', tmp))
-                cc += len(re.findall(r'\bfor\b', tmp))
-                cc += len(re.findall(r'\bwhile\b', tmp))
-                cc += len(re.findall(r'\bexcept\b', tmp))  
+            if is_python:
+                # Count decisions (elif, if, for, while, except) in one scan
+                cc += len(count_decisions(line))
 
                 # End-of-function: indentation back to (or above) def level
                 if line and not line.startswith("#"):
@@ -253,22 +659,9 @@ def count_cyclomatic_complexity(code, lang):
                     brace_depth -= closes
 
                 if entered_body:
-                    tmp = line
-
-                    # First count 'else if' as one decision to avoid double counting "if"
-                    ei = len(re.findall(r'\belse\s+if\b', tmp))
-                    cc += ei
-                    tmp = re.sub(r'\belse\s+if\b', 'ELSE_IF', tmp)
-
-                    # Now count remaining decisions
-                    cc += len(re.findall(r'\bif\b', tmp))
-                    cc += len(re.findall(r'\bfor\b', tmp))
-                    cc += len(re.findall(r'\bwhile\b', tmp))
-                    cc += len(re.findall(r'\bcase\b', tmp))
-                    cc += len(re.findall(r'\bcatch\b', tmp))
-                    cc += tmp.count('&&')
-                    cc += tmp.count('||')
-                    cc += tmp.count('?')  
+                    # All decision points in one scan; 'else if' is tried first
+                    # so it counts as a single decision
+                    cc += len(count_decisions(line))
 
                 # Close function only after body entered and depth returns to 0
                 if entered_body and brace_depth == 0:
@@ -286,106 +679,399 @@ def count_cyclomatic_complexity(code, lang):
 
 
 
-def compute_fan_in_out(source_files):
-    """
-    Fan-in and fan-out computation
-    Only function calls are taken into account
-    """
+# ---------- Lexer backend ----------
 
-    # Pass 1: Collect all function names across all files 
-    all_functions = set()
-    for file_path in source_files:
-        lang = detect_language(file_path)
-        try:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                code = f.read()
-        except Exception as e:
-            print(f"⚠️ Skipping {file_path}: {e}")
-            continue
+# Tokens that add a decision point, indexed by is_python
+TOKEN_DECISIONS = {
+    True: {"if", "elif", "for", "while", "except"},
+    False: {"if", "for", "while", "case", "catch", "&&", "||", "?"},
+}
+# Allowed between the ')' of a signature and its '{'
+SIGNATURE_QUALIFIERS = {"const", "noexcept", "override", "final", "volatile", "throws"}
+# Languages with a ?: conditional (Rust's ? propagates errors, Java's <?> is a wildcard)
+TERNARY_LANGUAGES = {"c", "cpp", "java"}
+# Languages declaring the return type between ')' and '{'
+RETURN_TYPE_LANGUAGES = {"go", "rust"}
+GO_TYPE_TOKENS = {"*", ".", "<", "-"}
+# Keywords introducing a named definition; "func(" / "fn(" alone is a function type or literal
+DEFINITION_KEYWORDS = {"go": "func", "rust": "fn"}
+# Languages with named functions nested in function bodies (anonymous/local classes)
+NESTED_DEFINITIONS = {"java"}
 
-        if lang == "python":
-            defs = re.findall(r"def\s+([A-Za-z_]\w*)\s*\([^)]*\)\s*:", code)
-        else:
-            defs = re.findall(r"\b([A-Za-z_]\w*)\s*\([^)]*\)\s*\{", code)
-        all_functions.update(defs)
-
-    # Filter out keywords that are not actual functions
-    keywords_to_ignore = {"if", "for", "while", "switch", "return", "sizeof", "catch", "try", "else", "elif", "do"}
-    all_functions = {f for f in all_functions if f not in keywords_to_ignore}
-
-    #  Initialize results
-    fan_in = {f: 0 for f in all_functions}
-    fan_out = {f: 0 for f in all_functions}
-    calls_map = {f: set() for f in all_functions}
-    callers_map = {f: set() for f in all_functions}
-
-    # Pass 2: Re-open each file and analyze calls 
-    for file_path in source_files:
-        lang = detect_language(file_path)
-        try:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                code = f.read()
-        except Exception as e:
-            print(f"⚠️ Skipping {file_path}: {e}")
-            continue
 
-        # Regex for function definitions depending on language
+def analyze_tokens(file_path, code, lang, ploc, profiler=NULL_PROFILER):
+    """
+    Summary from one token stream (see lexer.tokenize): comments, string
+    literals and preprocessor lines never reach LLOC, CC or call extraction.
+    Returns the summary and the logical lines (for per-function LLOC).
+    """
+    with profiler.stage("lex", lang):
+        tokens, lines, indents = tokenize(code, lang)
+    with profiler.stage("lloc", lang):
+        logical_lines = logical_lines_tokens(tokens, lines, lang)
+    with profiler.stage("functions", lang):
         if lang == "python":
-            func_pattern = re.compile(r"def\s+([A-Za-z_]\w*)\s*\([^)]*\)\s*:", re.MULTILINE)
+            funcs, def_lines, end_lines, local, calls, cyclomatic = extract_python_functions_tokens(
+                tokens, lines, indents)
         else:
-            func_pattern = re.compile(r"([A-Za-z_]\w*)\s*\([^)]*\)\s*\{", re.MULTILINE)
-
-        for match in func_pattern.finditer(code):
-            caller = match.group(1)
-            if caller not in all_functions:
-                continue
-
-            # Extract the function body
-            if lang == "python":
-                start_idx = match.end()
-                body_match = re.search(r"(?=^def\s+[A-Za-z_]\w*\s*\()", code[start_idx:], re.MULTILINE)
-                func_body = code[start_idx:start_idx + body_match.start()] if body_match else code[start_idx:]
-            else:
-                start_idx = match.end()
-                brace_count = 1
-                idx = start_idx
-                while idx < len(code) and brace_count > 0:
-                    if code[idx] == '{':
-                        brace_count += 1
-                    elif code[idx] == '}':
-                        brace_count -= 1
-                    idx += 1
-                func_body = code[start_idx:idx]
-
-            # Extract all possible calls in one pass
-            calls_found = set(re.findall(r"\b([A-Za-z_]\w*)\s*\(", func_body))
-
-            # Filter only user-defined functions and exclude self-calls
-            real_calls = calls_found & all_functions - {caller}
-
-            # Update metrics
-            fan_out[caller] += len(real_calls)
-            calls_map[caller].update(real_calls)
-            for callee in real_calls:
-                fan_in[callee] += 1
-                callers_map[callee].add(caller)
-
-    return fan_in, fan_out
-
-
-
+            funcs, def_lines, end_lines, local, calls, cyclomatic = extract_functions_tokens(
+                tokens, lines, indents, lang, is_header(file_path))
+    summary = {
+        "file": file_path,
+        "language": lang,
+        "ploc": ploc,
+        "lloc": len(logical_lines),
+        "functions": funcs,
+        "lines": def_lines,
+        "end_lines": end_lines,
+        "cyclomatic": cyclomatic,
+        "local": local,
+        "calls": calls,
+    }
+    return summary, logical_lines
 
 
+def analyze_python_ast(file_path, code, ploc, profiler=NULL_PROFILER):
+    """
+    Summary of a Python file from its syntax tree (see python_ast) and its
+    logical lines, or (None, None) if it does not parse (e.g. Python 2),
+    so the caller can fall back.
+    """
+    if not isinstance(code, str):
+        code = decode_source(bytes(code))
+    try:
+        with profiler.stage("parse", "python"):
+            tree = parse_python(code)
+    except (SyntaxError, ValueError, RecursionError):
+        return None, None
+    with profiler.stage("functions", "python"):
+        logical_lines, funcs, lines, end_lines, calls, cyclomatic = analyze_python_tree(tree)
+    summary = {
+        "file": file_path,
+        "language": "python",
+        "ploc": ploc,
+        "lloc": len(logical_lines),
+        "functions": funcs,
+        "lines": lines,
+        "end_lines": end_lines,
+        "cyclomatic": cyclomatic,
+        "local": [False] * len(funcs),
+        "calls": calls,
+    }
+    return summary, logical_lines
 
 
+def logical_lines_tokens(tokens, lines, lang):
+    """
+    Lines (ascending) counted by the rule of count_logical_loc (a call or
+    signature, an assignment or comparison, a statement end or a statement
+    keyword), applied to code tokens only. LLOC is their number.
+    """
+    statement_end = LANGUAGE_RULES[lang].get("statement_end")
+    keywords = set(LOGICAL_STATEMENTS)
+    counted_lines = array("i")
+    counted = open_line = close_line = 0
+    for tok, line in zip(tokens, lines):
+        if line == counted:
+            continue
+        if tok == "(":
+            open_line = line
+            if close_line != line:
+                continue
+        elif tok == ")":
+            close_line = line
+            if open_line != line:
+                continue
+        elif not (tok in keywords or tok == statement_end or "=" in tok):
+            continue
+        counted_lines.append(line)
+        counted = line
+    return counted_lines
 
 
+def _starts_return_type(lang, tok, line, paren_line):
+    if lang == "rust":
+        return tok in ("->", "where")
+    # Go: a newline after ')' ends the statement
+    return line == paren_line and (tok.isidentifier() or tok in ("*", "[", "(", "<"))
 
 
+def _return_type_step(lang, tok, prev, line, state):
+    """
+    One token after the ')' of a Go/Rust definition candidate, state being
+    [bracket depth, line of the previous token]: "type" while it can be
+    part of the return type, "body" for the '{' of the body, "end"
+    otherwise (the candidate was a call).
+    """
+    depth, last_line = state
+    state[1] = line
+    if lang == "rust":
+        if tok == "{":
+            return "body"
+        return "end" if tok in (";", "}") else "type"
+    if tok == "{" and prev not in ("interface", "struct"):
+        # A newline before '{' would have ended the statement
+        return "body" if not depth and line == last_line else "end"
+    if tok in ("(", "[", "{"):
+        state[0] += 1
+    elif tok in (")", "]", "}"):
+        if not depth:
+            return "end"
+        state[0] -= 1
+    elif not depth and (line != last_line or not (tok.isidentifier() or tok in GO_TYPE_TOKENS)):
+        return "end"
+    return "type"
+
+
+def extract_functions_tokens(tokens, lines, indents, lang, header=False):
+    """
+    Definitions of a brace language from its token stream: a name, a
+    balanced parameter list, optional qualifiers (a return type in Go
+    and Rust) and '{'. Calls and
+    decision points are credited to the innermost function body.
+    Where functions do not nest, a definition starting in column 0 closes
+    whatever is still open (braces unbalanced by #if/#else branches).
+    Returns funcs, lines, end_lines, local, calls, cyclomatic.
+    """
+    decisions = TOKEN_DECISIONS[False]
+    if lang not in TERNARY_LANGUAGES:
+        decisions = decisions - {"?"}
+    nested = lang in NESTED_DEFINITIONS
+    definition_keyword = DEFINITION_KEYWORDS.get(lang)
+    local_modifier = None if header else LOCAL_MODIFIERS.get(lang)
+
+    funcs, def_lines, end_lines, local, call_sets, cyclomatic = [], [], [], [], [], []
+    bodies = []      # open function bodies: (function index, brace depth outside the body)
+    candidates = []  # open "name(" groups: (name, line, paren depth, cannot be a definition)
+    closed = None    # candidate whose ')' was the previous token
+    returns = None   # return type state after closed (see _return_type_step)
+    declared = None  # name after fn/func, its '(' may follow type parameters
+    in_throws = False
+    is_local = False
+    depth = paren = 0
+    prev = prev2 = ""
+    for i, tok in enumerate(tokens):
+        if closed is not None:
+            opens_body = tok == "{"
+            if (returns is None and lang in RETURN_TYPE_LANGUAGES and not closed[3]
+                    and _starts_return_type(lang, tok, lines[i], lines[i - 1])):
+                returns = [0, lines[i - 1]]
+            if returns is not None:
+                step = _return_type_step(lang, tok, prev, lines[i], returns)
+                if step == "type":
+                    prev2, prev = prev, tok
+                    continue
+                returns = None
+                opens_body = step == "body"
+            if opens_body and not closed[3] and (nested or not bodies or indents.get(closed[1]) == 0):
+                if bodies and not nested:
+                    depth = bodies[0][1]
+                    for open_index, _ in bodies:
+                        end_lines[open_index] = lines[i - 1]
+                    bodies.clear()
+                index = len(funcs)
+                funcs.append(closed[0])
+                def_lines.append(closed[1])
+                end_lines.append(closed[1])
+                local.append(is_local)
+                call_sets.append(set())
+                cyclomatic.append(1)
+                bodies.append((index, depth))
+                depth += 1
+                closed = None
+                in_throws = is_local = False
+                prev2, prev = prev, tok
+                continue
+            if tok in SIGNATURE_QUALIFIERS or (in_throws and (tok.isidentifier() or tok in {",", "."})):
+                in_throws = in_throws or tok == "throws"
+                prev2, prev = prev, tok
+                continue
+            # Not followed by a body: it was a call
+            if bodies:
+                call_sets[bodies[-1][0]].add(closed[0])
+            closed = None
+            in_throws = False
+
+        if tok == "(":
+            if prev.isidentifier() and prev not in KEYWORDS_TO_IGNORE and prev != definition_keyword:
+                if definition_keyword is None:
+                    not_definition = prev2 == "new"
+                else:
+                    # Go methods: func (r *R) Name(
+                    not_definition = prev2 != definition_keyword and not (lang == "go" and prev2 == ")")
+                candidates.append((prev, lines[i - 1], paren, not_definition))
+            elif declared is not None and prev in (">", "]"):
+                # fn name<T>(...) / func Name[T any](...)
+                candidates.append((declared[0], declared[1], paren, False))
+                declared = None
+            paren += 1
+        elif tok == ")":
+            if paren:
+                paren -= 1
+            if candidates and candidates[-1][2] == paren:
+                closed = candidates.pop()
+        elif tok == "{":
+            depth += 1
+            is_local = False
+            declared = None
+        elif tok == "}":
+            if depth:
+                depth -= 1
+            if bodies and bodies[-1][1] == depth:
+                end_lines[bodies.pop()[0]] = lines[i]
+            is_local = False
+        elif tok == ";":
+            is_local = False
+            declared = None
+        elif tok in decisions:
+            # '?' after '<' or ',' is a Java wildcard (List<? extends T>)
+            if bodies and not (tok == "?" and prev in ("<", ",")):
+                cyclomatic[bodies[-1][0]] += 1
+        elif tok == local_modifier:
+            is_local = True
+        if prev == definition_keyword and tok.isidentifier():
+            declared = (tok, lines[i])
+        prev2, prev = prev, tok
+
+    if closed is not None and bodies:
+        call_sets[bodies[-1][0]].add(closed[0])
+    for open_index, _ in bodies:
+        end_lines[open_index] = lines[-1]
+    calls = [tuple(sorted(found - KEYWORDS_TO_IGNORE)) for found in call_sets]
+    return funcs, def_lines, end_lines, local, calls, cyclomatic
+
+
+def extract_python_functions_tokens(tokens, lines, indents):
+    """
+    Python definitions from the token stream. A body ends at the first
+    logical line indented at or left of its 'def'; nested functions get
+    their own entry and their calls/decisions are not credited to the parent.
+    """
+    decisions = TOKEN_DECISIONS[True]
+    funcs, def_lines, end_lines, call_sets, cyclomatic = [], [], [], [], []
+    bodies = []   # open functions: (function index, indentation of the def)
+    paren = 0
+    last_line = 0
+    prev = prev2 = ""
+    for i, tok in enumerate(tokens):
+        line = lines[i]
+        if line != last_line:
+            # A new logical line unless inside brackets or after a backslash
+            if not paren and prev != "\\":
+                indent = indents.get(line)
+                if indent is not None:
+                    while bodies and indent <= bodies[-1][1]:
+                        end_lines[bodies.pop()[0]] = lines[i - 1]
+            last_line = line
+
+        if prev == "def" and tok.isidentifier():
+            index = len(funcs)
+            funcs.append(tok)
+            def_lines.append(line)
+            end_lines.append(line)
+            call_sets.append(set())
+            cyclomatic.append(1)
+            bodies.append((index, indents.get(line, 0)))
+        elif tok in "([{":
+            if tok == "(" and prev.isidentifier() and prev2 != "def" and bodies:
+                call_sets[bodies[-1][0]].add(prev)
+            paren += 1
+        elif tok in ")]}":
+            if paren:
+                paren -= 1
+        elif tok in decisions:
+            if bodies:
+                cyclomatic[bodies[-1][0]] += 1
+        prev2, prev = prev, tok
+
+    for index, _ in bodies:
+        end_lines[index] = lines[-1]
+    calls = [tuple(sorted(found - KEYWORDS_TO_IGNORE)) for found in call_sets]
+    return funcs, def_lines, end_lines, [False] * len(funcs), calls, cyclomatic
+
+
+def definition_keys(name):
+    """
+    Names a definition is found by: Class.method by its full and its short name.
+    """
+    return (name, name.rpartition(".")[2]) if "." in name else (name,)
 
 
+def resolve_call(callee, file_path, directory, by_file, by_dir, by_name):
+    """
+    Node ids a call from file_path resolves to, by the rule of
+    build_call_graph, from its (file, key) / (directory, key) / key
+    indexes of definitions. None if nothing (or too much) matches.
+    """
+    candidates = by_file.get((file_path, callee)) or by_dir.get((directory, callee))
+    if not candidates:
+        candidates = by_name.get(callee)
+        if candidates is not None and len(candidates) > 1:
+            # Ambiguous across directories, no way to tell which one
+            return None
+    return candidates
 
 
+def build_call_graph(summaries):
+    """
+    Every definition becomes a node identified by (file, name, line),
+    numbered in summary order. A call is resolved to the definitions of
+    that name in the same file first, then to non-local definitions in
+    the same directory, then to the non-local definition anywhere if it
+    is unique. Several candidates in the same file or directory
+    (e.g. #ifdef variants) each get the call. Self-calls are excluded.
+    Qualified definitions (Class.method) are found by their full and
+    their short name; a caller gets at most one edge to each node.
+    """
+    nodes = []
+    by_file = {}   # (file, name) -> node ids
+    by_dir = {}    # (directory, name) -> non-local node ids
+    by_name = {}   # name -> non-local node ids
+    for summary in summaries:
+        file_path = summary["file"]
+        directory = os.path.dirname(file_path)
+        for name, line, is_local in zip(summary["functions"], summary["lines"], summary["local"]):
+            node = len(nodes)
+            nodes.append((file_path, name, line))
+            for key in definition_keys(name):
+                by_file.setdefault((file_path, key), []).append(node)
+                if not is_local:
+                    by_dir.setdefault((directory, key), []).append(node)
+                    by_name.setdefault(key, []).append(node)
+
+    sources = array("i")
+    targets = array("i")
+    caller = 0
+    for summary in summaries:
+        file_path = summary["file"]
+        directory = os.path.dirname(file_path)
+        for name, calls_found in zip(summary["functions"], summary["calls"]):
+            short = name.rpartition(".")[2]
+            # A.n and n may both be called and resolve to the same node
+            resolved = set()
+            for callee in calls_found:
+                if callee == name or callee == short:
+                    continue
+                candidates = resolve_call(callee, file_path, directory, by_file, by_dir, by_name)
+                if candidates:
+                    for target in candidates:
+                        if target not in resolved:
+                            resolved.add(target)
+                            sources.append(caller)
+                            targets.append(target)
+            caller += 1
 
+    return CallGraph(nodes, sources, targets)
 
 
+def compute_fan_in_out(summaries):
+    """
+    Fan-in and fan-out computation
+    Only function calls are taken into account
+    Runs in memory on the per-file summaries, no file is read again.
+    Returns {(file, function, line): fan_in}, {(file, function, line): fan_out}
+    """
+    graph = build_call_graph(summaries)
+    fan_in = dict(zip(graph.nodes, graph.fan_in_degrees()))
+    fan_out = dict(zip(graph.nodes, graph.fan_out_degrees()))
+    return fan_in, fan_out
@@ -1,67 +1,499 @@
 import argparse
 import csv
+import os
+import sys
+from collections import deque
+from functools import partial
+from itertools import chain, islice
+from analysis_cache import AnalysisCache, DEFAULT_MAX_MB
 from file_scanner import get_source_files
-from loc_counter import analyze_file, compute_fan_in_out
+from instrumentation import NULL_PROFILER, Profiler, Progress
+from io_pipeline import DEFAULT_QUEUE_DEPTH
+from loc_counter import BACKENDS, analyze_source, summary_rows, build_call_graph
+from results_io import numpy_available, write_results_npz
+from sharding import merge_shards, parse_shard, select_shard, write_shard
+
+# Output column order
+FIELDNAMES = [
+    "file", "language", "function", "signature",
+    "ploc_file", "lloc_file", "cyclomatic",
+    "fan_in", "fan_out",
+    "line_start", "line_end", "offset_start", "offset_end",
+    "ploc_function", "lloc_function"
+]
+
+# Files per worker task when the number of files is not known up front
+STREAM_CHUNKSIZE = 16
 
 def main():
-    parser = argparse.ArgumentParser(description="Measure LOC, McCabe complexity, Fan-in, Fan-out metrics.")
+    if sys.argv[1:2] == ["merge"]:
+        merge_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["history"]:
+        history_main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description="Measure LOC, McCabe complexity, Fan-in, Fan-out metrics.",
+                                     epilog="Merge shard results: measurement_tool.py merge --out OUT SHARD... "
+                                            "Metrics across git revisions: measurement_tool.py history --repo REPO REV...")
     parser.add_argument("--repo", type=str, required=True, help="Path to repo or single source file")
-    parser.add_argument("--out", type=str, default="results.csv", help="Output CSV file name")
+    parser.add_argument("--out", type=str, default=None,
+                        help="Output file name (default: results.csv, results.npz with --format npz)")
+    parser.add_argument("--format", choices=["csv", "npz"], default="csv",
+                        help="Output format: csv (default) or npz (columnar NumPy file, "
+                             "PLOC/LLOC stored once per file)")
+    parser.add_argument("--backend", choices=BACKENDS, default="heuristic",
+                        help="Analyzer: line-based heuristics (default) or a per-language lexer that "
+                             "ignores comments, strings and preprocessor lines")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes for per-file analysis (default: CPU count)")
+    parser.add_argument("--cache", type=str, default=None,
+                        help="Path of the analysis cache (default: <out>.cache)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the analysis cache")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_MB,
+                        help=f"Size cap of the analysis cache in MB (default: {DEFAULT_MAX_MB})")
+    incremental = parser.add_mutually_exclusive_group()
+    incremental.add_argument("--since", type=str, default=None, metavar="REV",
+                             help="Only re-analyze files changed since REV (git, working tree)")
+    incremental.add_argument("--diff", type=str, default=None, metavar="REV1..REV2",
+                             help="Only re-analyze files changed between two revisions (git)")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="Previous results CSV to patch and compare against (default: --out)")
+    parser.add_argument("--call-graph", type=str, default=None,
+                        help="Also export the call graph as a CSV edge list")
+    parser.add_argument("--function-index", type=str, default=None, metavar="PATH",
+                        help="Also write the line and byte offset span of every function (JSON), "
+                             "read back by function_index.py")
+    add_graph_arguments(parser)
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="i/N",
+                        help="Only analyze shard i of N (1-based) and write an intermediate file to --out "
+                             "for the merge subcommand")
+    parser.add_argument("--include", action="append", default=[], metavar="GLOB",
+                        help="Only analyze files matching this glob (repeatable)")
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="Skip files and directories matching this glob (repeatable)")
+    parser.add_argument("--respect-gitignore", action="store_true",
+                        help="Skip files and directories ignored by .gitignore files")
+    parser.add_argument("--max-file-size", type=int, default=None, metavar="KB",
+                        help="Skip files larger than this size in KB")
+    parser.add_argument("--skip-binary", action="store_true", help="Skip files that look binary")
+    parser.add_argument("--skip-generated", action="store_true",
+                        help="Skip files marked as generated (e.g. 'DO NOT EDIT', '@generated')")
+    parser.add_argument("--scan-threads", type=int, default=1,
+                        help="Threads listing directories ahead of the analysis (network filesystems)")
+    parser.add_argument("--readers", type=int, default=0,
+                        help="Threads reading files ahead of the analysis workers, for network filesystems "
+                             "and cold caches (default: 0, workers read their own files)")
+    parser.add_argument("--queue-depth", type=int, default=DEFAULT_QUEUE_DEPTH, metavar="N",
+                        help=f"Files read ahead / in flight per stage with --readers (default: {DEFAULT_QUEUE_DEPTH})")
+    parser.add_argument("--profile", action="store_true",
+                        help="Report wall/CPU time per stage and language, bytes read and slowest files on stderr")
+    parser.add_argument("--profile-slowest", type=int, default=10, metavar="N",
+                        help="Number of slowest files listed by --profile (default: 10)")
+    parser.add_argument("--trace", type=str, default=None, metavar="PATH",
+                        help="Write a Chrome trace JSON of all stages (implies --profile)")
+    parser.add_argument("--cprofile", type=str, default=None, metavar="PATH",
+                        help="Dump cProfile statistics (pstats) of the run")
+    parser.add_argument("--progress", action="store_true", help="Show a live progress/ETA line on stderr")
     args = parser.parse_args()
+    set_default_out(args)
+    if args.format == "npz" and not numpy_available():
+        parser.error("--format npz requires NumPy (pip install numpy)")
+    if args.shard and (args.since or args.diff):
+        parser.error("--shard cannot be combined with --since/--diff")
+    if (args.since or args.diff) and (args.include or args.exclude or args.respect_gitignore
+                                      or args.max_file_size is not None or args.skip_binary
+                                      or args.skip_generated):
+        parser.error("--since/--diff take the file list from git, scanner filters "
+                     "(--include, --exclude, --respect-gitignore, --max-file-size, --skip-*) do not apply")
+    if args.readers < 0 or args.queue_depth < 1:
+        parser.error("--readers must be >= 0 and --queue-depth >= 1")
+
+    if args.cprofile:
+        import cProfile
+        prof = cProfile.Profile()
+        prof.runcall(run, args, parser)
+        prof.dump_stats(args.cprofile)
+        print(f"cProfile statistics saved to: {args.cprofile}")
+    else:
+        run(args, parser)
+
 
-    # Scan all source files
-    source_files = get_source_files(args.repo)
-    if not source_files:
+def run(args, parser):
+    profiler = NULL_PROFILER
+    if args.profile or args.trace:
+        profiler = Profiler(slowest=args.profile_slowest, trace=bool(args.trace))
+    progress = Progress() if args.progress else None
+
+    changed_files = set()
+    previous_rows = []
+    if args.since or args.diff:
+        # Git-aware incremental mode: file list from git, changed files re-analyzed,
+        # everything else comes from the cache
+        from git_incremental import git_changed_files, git_source_files, load_results_csv, order_like_previous
+        try:
+            changed_files = git_changed_files(args.repo, since=args.since, diff=args.diff)
+            previous_rows = load_results_csv(args.baseline or args.out)
+            source_files = order_like_previous(
+                git_source_files(args.repo, include_untracked=args.since is not None), previous_rows)
+        except (OSError, RuntimeError, ValueError) as e:
+            parser.error(str(e))
+        print(f"{len(changed_files)} changed files to re-analyze.")
+        if args.no_cache:
+            print("⚠️ --no-cache: unchanged files have to be analyzed again.")
+    else:
+        # Scan all source files, analysis starts while the scan is still running
+        source_files = get_source_files(
+            args.repo, include=args.include, exclude=args.exclude,
+            gitignore=args.respect_gitignore,
+            max_size=args.max_file_size * 1024 if args.max_file_size is not None else None,
+            skip_binary=args.skip_binary, skip_generated=args.skip_generated,
+            threads=args.scan_threads)
+
+    shard_indices = None
+    if args.shard:
+        # Every shard lists the whole tree and keeps the scan index of its files
+        shard_indices, source_files, scan = select_shard(source_files, args.repo, *args.shard)
+        print(f"Shard {args.shard[0]}/{args.shard[1]}: {len(source_files)} files.")
+
+    cache = None
+    if not args.no_cache:
+        cache = AnalysisCache(args.cache or args.out + ".cache", args.cache_max_mb, args.backend)
+
+    # Analyze each file individually (single read per file, cached files skipped)
+    if progress is not None:
+        source_files = progress.track(source_files)
+    results = collect_summaries(source_files, args.jobs, cache, changed_files, profiler, progress,
+                                args.backend, args.readers, args.queue_depth)
+    if progress is not None:
+        progress.finish()
+    n_files = len(results)
+    if cache is not None:
+        cache.close()
+    if shard_indices is not None:
+        # Fan-in/fan-out need all shards, they are resolved by the merge
+        n_written = write_shard(args.out, {"shard": args.shard[0], "shards": args.shard[1],
+                                           "repo": args.repo, "scan": scan, "backend": args.backend},
+                                shard_indices, results)
+        print(f"Shard results ({n_written} files) saved to: {args.out}")
+        return
+    summaries = [s for s in results if s is not None]
+    del results
+    if not n_files:
         print("No supported source files found.")
         return
+    if cache is not None:
+        print(f"Cache: {cache.hits} files reused, {n_files - cache.hits} files analyzed.")
+
+    # Build the call graph across the whole repo from the summaries,
+    # fan-in / fan-out are its degree counts
+    with profiler.stage("fan_in_out"):
+        graph = build_call_graph(summaries)
 
-    all_rows = []  
+    # Stream the final rows to CSV, they are never all resident at once
+    with profiler.stage("write_csv"):
+        save_results_to_csv(iter_result_rows(summaries, graph), args.out, args.format)
 
-    # Analyze each file individually 
-    for file_path in source_files:
-        rows, _ = analyze_file(file_path)
-        all_rows.extend(rows)
+    print(f"Analysis complete! {n_files} files processed, "
+          f"{sum(len(s['functions']) for s in summaries)} functions analyzed.")
+    print(f"Results saved to: {args.out}")
+
+    with profiler.stage("graph_outputs"):
+        write_graph_outputs(args, summaries, graph)
 
-    # Compute fan-in / fan-out across the whole repo
-    fan_in_map, fan_out_map = compute_fan_in_out(source_files)
+    if args.since or args.diff:
+        from git_incremental import write_delta_report
+        delta_file = os.path.splitext(args.out)[0] + ".delta.csv"
+        n_changed = write_delta_report(
+            previous_rows, iter_result_rows(summaries, graph), delta_file)
+        print(f"{n_changed} functions changed, delta report saved to: {delta_file}")
 
-    # Merge fan-in/out data into results
-    for row in all_rows:
-        func_name = row["function"].split("(")[0].split()[-1].strip()
-        row["fan_in"] = fan_in_map.get(func_name, 0)
-        row["fan_out"] = fan_out_map.get(func_name, 0)
+    if profiler.enabled:
+        profiler.report()
+        if args.trace:
+            profiler.write_trace(args.trace)
+            print(f"Trace saved to: {args.trace}")
 
-    # Save final results to CSV
-    save_results_to_csv(all_rows, args.out)
 
-    print(f"Analysis complete! {len(source_files)} files processed, "
-          f"{sum(1 for r in all_rows if r.get('function'))} functions analyzed.")
+def merge_main(argv):
+    parser = argparse.ArgumentParser(prog="measurement_tool.py merge",
+                                     description="Merge the intermediate files of a --shard i/N run.")
+    parser.add_argument("shards", nargs="+", help="Intermediate files written with --shard")
+    parser.add_argument("--out", type=str, default=None,
+                        help="Output file name (default: results.csv, results.npz with --format npz)")
+    parser.add_argument("--format", choices=["csv", "npz"], default="csv", help="Output format (default: csv)")
+    parser.add_argument("--call-graph", type=str, default=None,
+                        help="Also export the call graph as a CSV edge list")
+    parser.add_argument("--function-index", type=str, default=None, metavar="PATH",
+                        help="Also write the line and byte offset span of every function (JSON)")
+    add_graph_arguments(parser)
+    args = parser.parse_args(argv)
+    set_default_out(args)
+    if args.format == "npz" and not numpy_available():
+        parser.error("--format npz requires NumPy (pip install numpy)")
+
+    try:
+        summaries = merge_shards(args.shards)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    # Same resolution as a single run: the graph spans all shards
+    graph = build_call_graph(summaries)
+    save_results_to_csv(iter_result_rows(summaries, graph), args.out, args.format)
+    print(f"Merged {len(args.shards)} shards: {len(summaries)} files, {len(graph)} functions.")
     print(f"Results saved to: {args.out}")
+    write_graph_outputs(args, summaries, graph)
+
+
+def history_main(argv):
+    parser = argparse.ArgumentParser(prog="measurement_tool.py history",
+                                     description="Measure a series of git revisions from the object store "
+                                                 "(no checkout), reusing the analysis of unchanged files.")
+    parser.add_argument("revisions", nargs="+", metavar="REV",
+                        help="Revisions (tag, branch, hash) or ranges A..B (first-parent commits after A up to B)")
+    parser.add_argument("--repo", type=str, required=True, help="Path of a local git repository")
+    parser.add_argument("--out", type=str, default="history.csv",
+                        help="Per-function time series CSV (default: history.csv)")
+    parser.add_argument("--summary", type=str, default=None,
+                        help="Aggregates per revision CSV (default: <out>.revisions.csv)")
+    parser.add_argument("--aggregates-only", action="store_true", help="Only write the aggregates per revision")
+    parser.add_argument("--every", type=int, default=1, metavar="N",
+                        help="Only measure every N-th commit of a range (its last commit always)")
+    parser.add_argument("--path", action="append", default=[], metavar="PATHSPEC",
+                        help="Only files below this path (repeatable)")
+    parser.add_argument("--backend", choices=BACKENDS, default="heuristic", help="Analyzer (default: heuristic)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+    if args.every < 1:
+        parser.error("--every must be >= 1")
+
+    from git_history import resolve_revisions, write_history
+    try:
+        revisions = resolve_revisions(args.repo, args.revisions, args.every)
+    except RuntimeError as e:
+        parser.error(str(e))
+    if not revisions:
+        print("No revisions to measure.")
+        return
+    summary_file = args.summary or os.path.splitext(args.out)[0] + ".revisions.csv"
+    analyzed = write_history(args.repo, revisions, args.out, summary_file, args.jobs, args.backend,
+                             args.path, functions=not args.aggregates_only)
+    print(f"History of {len(revisions)} revisions complete, {analyzed} files analyzed.")
+    if not args.aggregates_only:
+        print(f"Per-function time series saved to: {args.out}")
+    print(f"Aggregates per revision saved to: {summary_file}")
+
+
+def set_default_out(args):
+    # Without --out the file name follows --format
+    if args.out is None:
+        args.out = "results.npz" if args.format == "npz" else "results.csv"
+
+
+def add_graph_arguments(parser):
+    parser.add_argument("--graph-metrics", type=str, default=None, metavar="PATH",
+                        help="Also write call graph analytics per function (CSV): transitive fan-in/fan-out, "
+                             "recursion cycle (SCC), depth from the entry points and Henry-Kafura complexity")
+    parser.add_argument("--entry", action="append", default=[], metavar="NAME",
+                        help="Entry point for the depth in --graph-metrics (repeatable, "
+                             "default: functions nobody calls)")
+    parser.add_argument("--graph-export", type=str, default=None, metavar="PATH",
+                        help="Also export the call graph as GraphML, or DOT for a .dot/.gv path")
+
+
+def write_graph_outputs(args, summaries, graph):
+    """
+    The optional outputs derived from the summaries and the call graph.
+    """
+    if args.call_graph:
+        graph.write_edges_csv(args.call_graph)
+        print(f"Call graph ({len(graph)} functions, {graph.num_edges} calls) saved to: {args.call_graph}")
 
+    if args.function_index:
+        from function_index import write_function_index
+        n_indexed = write_function_index(summaries, args.function_index)
+        print(f"Function index ({n_indexed} functions) saved to: {args.function_index}")
 
-def save_results_to_csv(results, output_file):
-    if not results:
+    if args.graph_metrics or args.graph_export:
+        import graph_analytics
+        unknown = graph_analytics.unknown_entries(graph, args.entry)
+        if unknown:
+            print(f"⚠️ --entry: no function named {', '.join(unknown)}.")
+        metrics = graph_analytics.graph_metrics(graph, summaries, args.entry)
+        if args.graph_metrics:
+            graph_analytics.write_graph_metrics_csv(graph, metrics, args.graph_metrics)
+            n_cycles = sum(1 for c, size in zip(metrics["scc"], metrics["scc_size"]) if size > 1)
+            print(f"Graph metrics ({n_cycles} functions in recursion cycles) saved to: {args.graph_metrics}")
+        if args.graph_export:
+            attributes = {"fan_in": graph.fan_in_degrees(), "fan_out": graph.fan_out_degrees()}
+            attributes.update(metrics)
+            graph_analytics.write_graph(graph, args.graph_export, attributes)
+            print(f"Call graph exported to: {args.graph_export}")
+
+
+def _analyze_profiled(file_path, trace=False, backend="heuristic", data=None):
+    # Worker side of a profiled run: the stats travel back with the summary
+    profiler = Profiler(trace=trace)
+    summary = analyze_source(file_path, profiler, backend, data)
+    return summary, profiler.snapshot()
+
+
+def _analyze_prefetched(file_path, data, backend="heuristic", trace=None):
+    # Worker side of a pipelined run: the content was read by the reader threads
+    if trace is None:
+        return analyze_source(file_path, backend=backend, data=data)
+    return _analyze_profiled(file_path, trace, backend, data)
+
+
+def analyze_all(source_files, jobs=1, profiler=NULL_PROFILER, backend="heuristic",
+                readers=0, queue_depth=DEFAULT_QUEUE_DEPTH):
+    """
+    Yield the per-file summaries in the order of source_files (a list or
+    any iterable, e.g. the scanner generator).
+    With jobs > 1 the files are spread over a process pool in chunks,
+    so the result is identical to a serial run.
+    With readers > 0 the files are read ahead by that many threads instead
+    (see analyze_pipelined).
+    """
+    if hasattr(source_files, "__len__"):
+        jobs = min(jobs, len(source_files))
+        # A few chunks per worker keeps IPC cheap while still balancing the load
+        chunksize = max(1, min(256, len(source_files) // (max(jobs, 1) * 4)))
+    else:
+        # Unknown length: no pool for a single file
+        source_files = iter(source_files)
+        head = list(islice(source_files, 2))
+        if len(head) < 2:
+            jobs = 1
+        source_files = chain(head, source_files)
+        chunksize = STREAM_CHUNKSIZE
+
+    if readers > 0:
+        yield from analyze_pipelined(source_files, jobs, profiler, backend, readers, queue_depth)
+        return
+
+    if jobs <= 1:
+        for file_path in source_files:
+            yield analyze_source(file_path, profiler, backend)
+        return
+
+    # Imported here: a single-file run never pays for the pool machinery
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        if not profiler.enabled:
+            worker = partial(analyze_source, backend=backend)
+            yield from executor.map(worker, source_files, chunksize=chunksize)
+            return
+        worker = partial(_analyze_profiled, trace=profiler.trace, backend=backend)
+        for summary, snapshot in executor.map(worker, source_files, chunksize=chunksize):
+            profiler.merge(snapshot)
+            yield summary
+
+
+def analyze_pipelined(source_files, jobs=1, profiler=NULL_PROFILER, backend="heuristic",
+                      readers=4, queue_depth=DEFAULT_QUEUE_DEPTH):
+    """
+    Reader threads -> analysis workers -> consumer, in the order of
+    source_files. Each stage holds at most queue_depth files, so a slow
+    consumer stalls the workers and the workers stall the readers:
+    memory stays bounded while reads overlap the analysis.
+    """
+    from io_pipeline import bounded_map, prefetch
+    contents = prefetch(source_files, readers, queue_depth)
+    if jobs <= 1:
+        for file_path, data in contents:
+            yield analyze_source(file_path, profiler, backend, data)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        if not profiler.enabled:
+            worker = partial(_analyze_prefetched, backend=backend)
+            yield from bounded_map(executor, worker, contents, queue_depth)
+            return
+        worker = partial(_analyze_prefetched, backend=backend, trace=profiler.trace)
+        for summary, snapshot in bounded_map(executor, worker, contents, queue_depth):
+            profiler.merge(snapshot)
+            yield summary
+
+
+def collect_summaries(source_files, jobs=1, cache=None, refresh=(),
+                      profiler=NULL_PROFILER, progress=None, backend="heuristic",
+                      readers=0, queue_depth=DEFAULT_QUEUE_DEPTH):
+    """
+    Per-file summaries in the order of source_files, taken from the cache
+    when possible and analyzed otherwise. Files in refresh are always analyzed.
+    """
+    if cache is None:
+        summaries = []
+        for summary in analyze_all(source_files, jobs, profiler, backend, readers, queue_depth):
+            summaries.append(summary)
+            if progress is not None:
+                progress.advance()
+        return summaries
+
+    # Cached summary, or None for a file handed to analyze_all, in file order
+    pending = deque()
+
+    def missing():
+        # Looked up as the scanner yields paths, misses are analyzed meanwhile
+        for file_path in source_files:
+            with profiler.stage("cache_lookup"):
+                summary = None if file_path in refresh else cache.get(file_path)
+            pending.append(summary)
+            if summary is None:
+                yield file_path
+            elif progress is not None:
+                progress.advance()
+
+    summaries = []
+    for summary in analyze_all(missing(), jobs, profiler, backend, readers, queue_depth):
+        while pending[0] is not None:
+            summaries.append(pending.popleft())
+        pending.popleft()
+        summaries.append(summary)
+        if summary is not None:
+            cache.put(summary)
+        if progress is not None:
+            progress.advance()
+    summaries.extend(pending)
+    return summaries
+
+
+def iter_result_rows(summaries, graph):
+    """
+    Generate the output rows file by file from the compact summaries,
+    with fan-in/fan-out filled in from the call graph.
+    """
+    # Node ids follow the definition order of the summaries
+    node = 0
+    for summary in summaries:
+        for row in summary_rows(summary):
+            row["fan_in"] = graph.fan_in(node)
+            row["fan_out"] = graph.fan_out(node)
+            node += 1
+            yield row
+
+
+def save_results_to_csv(results, output_file, format="csv"):
+    """
+    Stream rows (any iterable of dicts) to CSV with the fixed FIELDNAMES schema,
+    or to a columnar .npz file with format="npz".
+    """
+    results = iter(results)
+    first = next(results, None)
+    if first is None:
         print("No results to save.")
         return
 
-    # Merge all keys to get a complete header
-    fieldnames = set()
-    for r in results:
-        fieldnames.update(r.keys())
-    fieldnames = list(fieldnames)
-
-    # Preferred column order
-    preferred_order = [
-        "file", "language", "function", "signature",
-        "ploc_file", "lloc_file", "cyclomatic",
-        "fan_in", "fan_out"
-    ]
-    fieldnames = [f for f in preferred_order if f in fieldnames] + \
-                 [f for f in fieldnames if f not in preferred_order]
+    if format == "npz":
+        write_results_npz(chain([first], results), output_file)
+        return
 
     with open(output_file, mode="w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
         writer.writeheader()
+        writer.writerow(first)
         for row in results:
             writer.writerow(row)
 
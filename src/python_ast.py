@@ -0,0 +1,107 @@
+import ast
+import warnings
+
+# Nodes adding one decision point each (elif is a nested If)
+DECISION_NODES = (ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler)
+if hasattr(ast, "match_case"):  # Python 3.10+
+    DECISION_NODES += (ast.match_case,)
+FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+def parse_python(code):
+    """
+    ast of a Python source (str), without the SyntaxWarnings of old files.
+    Raises SyntaxError/ValueError/RecursionError for code that does not parse.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return ast.parse(code)
+
+
+def analyze_python_tree(tree):
+    """
+    One walk over a module. Definitions are qualified by their enclosing
+    classes and functions (Class.method, outer.inner). Returns
+    logical_lines, funcs, lines, end_lines, calls, cyclomatic:
+    - logical lines (LLOC): lines on which a statement starts, docstrings excluded
+    - CC: 1 + if/elif, ternaries, loops, except, match cases, comprehension
+      for/if clauses and every extra and/or operand
+    - calls: callee names (self.m() / cls.m() in a method become Class.m),
+      decisions and calls of nested functions are not credited to the parent
+    """
+    funcs, lines, end_lines, call_sets, cyclomatic = [], [], [], [], []
+    statement_lines = set()
+    # (node, owning function index, qualified prefix, class being defined, class bound to self)
+    stack = [(child, None, "", None, None) for child in reversed(tree.body)]
+    while stack:
+        node, owner, prefix, in_class, self_class = stack.pop()
+
+        if isinstance(node, ast.stmt):
+            if not (isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)
+                    and isinstance(node.value.value, str)):
+                statement_lines.add(node.lineno)
+
+        if isinstance(node, FUNCTION_NODES):
+            name = prefix + node.name
+            index = len(funcs)
+            funcs.append(name)
+            lines.append(node.lineno)
+            end_lines.append(node.end_lineno)
+            call_sets.append(set())
+            cyclomatic.append(1)
+            # Decorators, defaults and annotations are evaluated in the enclosing scope
+            for child in _signature_nodes(node):
+                stack.append((child, owner, prefix, in_class, self_class))
+            body_class = in_class or self_class
+            for child in reversed(node.body):
+                stack.append((child, index, name + ".", None, body_class))
+            continue
+
+        if isinstance(node, ast.ClassDef):
+            name = prefix + node.name
+            for child in node.decorator_list + node.bases + [k.value for k in node.keywords]:
+                stack.append((child, owner, prefix, in_class, self_class))
+            for child in reversed(node.body):
+                stack.append((child, owner, name + ".", name, self_class))
+            continue
+
+        if owner is not None:
+            if isinstance(node, DECISION_NODES):
+                cyclomatic[owner] += 1
+            elif isinstance(node, ast.BoolOp):
+                cyclomatic[owner] += len(node.values) - 1
+            elif isinstance(node, ast.comprehension):
+                cyclomatic[owner] += 1 + len(node.ifs)
+            elif isinstance(node, ast.Call):
+                callee = _callee_name(node.func, self_class)
+                if callee is not None:
+                    call_sets[owner].add(callee)
+
+        # Reversed, so nested definitions come off the stack in source order
+        for child in reversed(list(ast.iter_child_nodes(node))):
+            stack.append((child, owner, prefix, in_class, self_class))
+
+    calls = [tuple(sorted(found)) for found in call_sets]
+    return sorted(statement_lines), funcs, lines, end_lines, calls, cyclomatic
+
+
+def _signature_nodes(node):
+    args = node.args
+    nodes = list(node.decorator_list) + list(args.defaults) + [d for d in args.kw_defaults if d is not None]
+    for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+        if arg is not None and arg.annotation is not None:
+            nodes.append(arg.annotation)
+    if node.returns is not None:
+        nodes.append(node.returns)
+    return nodes
+
+
+def _callee_name(func, self_class):
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        value = func.value
+        if self_class is not None and isinstance(value, ast.Name) and value.id in ("self", "cls"):
+            return f"{self_class}.{func.attr}"
+        return func.attr
+    return None
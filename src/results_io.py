@@ -0,0 +1,144 @@
+import csv
+
+# Columns of the function table, next to the file table (file, language, PLOC, LLOC)
+FUNCTION_COLUMNS = ["cyclomatic", "fan_in", "fan_out",
+                    "line_start", "line_end", "offset_start", "offset_end",
+                    "ploc_function", "lloc_function"]
+NPZ_FORMAT_VERSION = 2
+# Version 1 files have no function spans, their span columns load as zeros
+READABLE_NPZ_VERSIONS = (1, 2)
+
+
+def numpy_available():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _require_numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        raise RuntimeError("The npz results format requires NumPy (pip install numpy).")
+    return np
+
+
+def _pack_strings(np, strings):
+    # String tables are stored as one NUL separated UTF-8 blob
+    return np.frombuffer("\0".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_strings(blob):
+    text = blob.tobytes().decode("utf-8")
+    return text.split("\0") if text else []
+
+
+def write_results_npz(results, output_file):
+    """
+    Write rows as a columnar, typed NumPy .npz file: a file table (name,
+    language, PLOC, LLOC stored once per file) and a function table with
+    dictionary-encoded file and function names. Returns the number of rows.
+    """
+    np = _require_numpy()
+    from array import array
+
+    file_ids, languages, function_ids = {}, {}, {}
+    file_language, file_ploc, file_lloc = array("B"), array("q"), array("q")
+    func_file, func_name = array("i"), array("i")
+    columns = {c: array("q") for c in FUNCTION_COLUMNS}
+
+    for row in results:
+        file_id = file_ids.get(row["file"])
+        if file_id is None:
+            file_id = file_ids[row["file"]] = len(file_ids)
+            file_language.append(languages.setdefault(row["language"], len(languages)))
+            file_ploc.append(int(row["ploc_file"]))
+            file_lloc.append(int(row["lloc_file"]))
+        func_file.append(file_id)
+        func_name.append(function_ids.setdefault(row["function"], len(function_ids)))
+        for c in FUNCTION_COLUMNS:
+            columns[c].append(int(row[c]))
+
+    with open(output_file, "wb") as f:
+        np.savez(
+            f,
+            format_version=np.array(NPZ_FORMAT_VERSION),
+            languages=_pack_strings(np, languages),
+            file_names=_pack_strings(np, file_ids),
+            file_language=np.frombuffer(file_language, dtype=np.uint8),
+            file_ploc=np.frombuffer(file_ploc, dtype=np.int64),
+            file_lloc=np.frombuffer(file_lloc, dtype=np.int64),
+            function_names=_pack_strings(np, function_ids),
+            func_file=np.frombuffer(func_file, dtype=np.int32),
+            func_name=np.frombuffer(func_name, dtype=np.int32),
+            **{c: np.frombuffer(columns[c], dtype=np.int64) for c in FUNCTION_COLUMNS}
+        )
+    return len(func_file)
+
+
+def load_results(path):
+    """
+    Load a results file (.npz or CSV) into columns:
+    files, languages: string tables; file_language, file_ploc, file_lloc: per file;
+    function_names: string table; func_file, func_name and FUNCTION_COLUMNS: per function.
+    Per-file and per-function columns are NumPy arrays.
+    """
+    np = _require_numpy()
+    with open(path, "rb") as f:
+        is_npz = f.read(4) == b"PK\x03\x04"
+    if not is_npz:
+        return _load_results_csv(np, path)
+
+    with np.load(path, allow_pickle=False) as data:
+        if int(data["format_version"]) not in READABLE_NPZ_VERSIONS:
+            raise ValueError(f"{path}: unsupported results format version {int(data['format_version'])}")
+        result = {
+            "files": _unpack_strings(data["file_names"]),
+            "languages": _unpack_strings(data["languages"]),
+            "function_names": _unpack_strings(data["function_names"]),
+        }
+        for key in ["file_language", "file_ploc", "file_lloc", "func_file", "func_name"] + FUNCTION_COLUMNS:
+            if key in data.files:
+                result[key] = data[key]
+            else:
+                result[key] = np.zeros(len(data["func_file"]), dtype=np.int64)
+    return result
+
+
+def _load_results_csv(np, path):
+    file_ids, languages, function_ids = {}, {}, {}
+    file_language, file_ploc, file_lloc = [], [], []
+    func_file, func_name = [], []
+    columns = {c: [] for c in FUNCTION_COLUMNS}
+
+    def to_int(value):
+        return int(value) if value else 0
+
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            file_id = file_ids.get(row["file"])
+            if file_id is None:
+                file_id = file_ids[row["file"]] = len(file_ids)
+                file_language.append(languages.setdefault(row["language"], len(languages)))
+                file_ploc.append(to_int(row["ploc_file"]))
+                file_lloc.append(to_int(row["lloc_file"]))
+            func_file.append(file_id)
+            func_name.append(function_ids.setdefault(row["function"], len(function_ids)))
+            for c in FUNCTION_COLUMNS:
+                columns[c].append(to_int(row.get(c)))
+
+    result = {
+        "files": list(file_ids),
+        "languages": list(languages),
+        "function_names": list(function_ids),
+        "file_language": np.array(file_language, dtype=np.uint8),
+        "file_ploc": np.array(file_ploc, dtype=np.int64),
+        "file_lloc": np.array(file_lloc, dtype=np.int64),
+        "func_file": np.array(func_file, dtype=np.int32),
+        "func_name": np.array(func_name, dtype=np.int32),
+    }
+    for c in FUNCTION_COLUMNS:
+        result[c] = np.array(columns[c], dtype=np.int64)
+    return result
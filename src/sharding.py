@@ -0,0 +1,133 @@
+import argparse
+import gzip
+import json
+import os
+import zlib
+
+SHARD_FORMAT = "metrics-shard"
+SHARD_FORMAT_VERSION = 2
+
+
+def parse_shard(text):
+    """
+    argparse type of --shard: "i/N" with 1 <= i <= N, returned as (i, N).
+    """
+    try:
+        i, n = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {text!r}")
+    if n < 1 or not 1 <= i <= n:
+        raise argparse.ArgumentTypeError(f"shard {text!r} out of range, expected 1 <= i <= N")
+    return i, n
+
+
+def shard_of(file_path, root, n_shards):
+    """
+    Shard (1..N) of a file: CRC32 of its path relative to root, so every
+    host gets the same partition whatever the mount point.
+    """
+    return zlib.crc32(_relative_key(file_path, root)) % n_shards + 1
+
+
+def _relative_key(file_path, root):
+    rel = os.path.relpath(file_path, root).replace(os.sep, "/")
+    return rel.encode("utf-8", errors="surrogateescape")
+
+
+def select_shard(source_files, root, shard, n_shards):
+    """
+    Files of one shard, their indices in the full scan order and a
+    fingerprint of that scan ("<files>:<CRC32 of the relative paths>").
+    Every shard lists the whole tree, so the indices agree across shards
+    whose fingerprints are equal, whatever the mount point.
+    """
+    if os.path.isfile(root):
+        root = os.path.dirname(root)
+    indices, files = [], []
+    scan_crc = 0
+    n_scanned = 0
+    for index, file_path in enumerate(source_files):
+        key = _relative_key(file_path, root)
+        scan_crc = zlib.crc32(key + b"\0", scan_crc)
+        n_scanned += 1
+        if zlib.crc32(key) % n_shards + 1 == shard:
+            indices.append(index)
+            files.append(file_path)
+    return indices, files, f"{n_scanned}:{scan_crc:08x}"
+
+
+def write_shard(output_file, header, indices, summaries):
+    """
+    Intermediate result of one shard: a gzipped JSON-lines file with a
+    header, then one [scan index, summary] line per file. Summaries keep
+    the definitions and unresolved call sets, the merge resolves them.
+    """
+    header = dict(header, format=SHARD_FORMAT, version=SHARD_FORMAT_VERSION)
+    count = 0
+    with gzip.open(output_file, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(header) + "\n")
+        for index, summary in zip(indices, summaries):
+            if summary is None:
+                continue
+            f.write(json.dumps([index, summary], separators=(",", ":")) + "\n")
+            count += 1
+    return count
+
+
+def read_shard(path):
+    """
+    (header, [(scan index, summary)]) of one intermediate file.
+    Raises OSError if it cannot be opened, ValueError if it is not a
+    complete shard file of this version.
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if not isinstance(header, dict) or header.get("format") != SHARD_FORMAT \
+                    or header.get("version") != SHARD_FORMAT_VERSION:
+                raise ValueError(f"{path} is not a shard file of this version")
+            entries = []
+            for line in f:
+                index, summary = json.loads(line)
+                entries.append((index, summary))
+    except (gzip.BadGzipFile, EOFError, zlib.error, json.JSONDecodeError) as e:
+        raise ValueError(f"{path} is truncated or not a shard file ({e})")
+    return header, entries
+
+
+def _rebase(file_path, root, new_root):
+    if file_path == root:
+        return new_root
+    return os.path.join(new_root, os.path.relpath(file_path, root))
+
+
+def merge_shards(paths):
+    """
+    Summaries of all shards in single-run scan order. All shards of one
+    run (same N, backend and scanned files) have to be present exactly once.
+    File paths are rebased onto the repo path of the first shard.
+    """
+    headers = {}
+    entries = []
+    for path in paths:
+        header, shard_entries = read_shard(path)
+        shard = header["shard"]
+        if shard in headers:
+            raise ValueError(f"Shard {shard}/{header['shards']} given twice")
+        first = next(iter(headers.values()), header)
+        for key in ("shards", "backend", "scan"):
+            if header[key] != first[key]:
+                raise ValueError(f"{path}: {key} {header[key]!r} differs from {first[key]!r}")
+        headers[shard] = header
+        if header["repo"] != first["repo"]:
+            # Same tree mounted elsewhere: one root, as in a single run
+            for _, summary in shard_entries:
+                summary["file"] = _rebase(summary["file"], header["repo"], first["repo"])
+        entries.extend(shard_entries)
+
+    n_shards = next(iter(headers.values()))["shards"] if headers else 0
+    missing = sorted(set(range(1, n_shards + 1)) - set(headers))
+    if missing:
+        raise ValueError(f"Missing shards: {', '.join(f'{i}/{n_shards}' for i in missing)}")
+    entries.sort(key=lambda entry: entry[0])
+    return [summary for _, summary in entries]